@@ -1,9 +1,45 @@
 """
 Generic plot functions based on matplotlib
+
+Submodules and public functions are loaded lazily on first access
+(PEP 562), so that importing this package does not import matplotlib
+or select a backend until a plot function is actually used.
 """
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import sys
+import importlib
+
+
+## Public names and the submodules providing them
+_LAZY_ATTRS = {
+	'show_or_save_plot': 'common',
+	'plot_ax_frame': 'frame',
+	'create_multi_plot': 'multi',
+	'plot_xy': 'xy',
+	'plot_density': 'xy',
+	'compute_density': 'density',
+	'DensityGrid': 'density',
+	'plot_histogram': 'histogram',
+	'plot_grid': 'grid',
+	'GridPlot': 'grid',
+	'GridStats': 'stats',
+	'compute_contours': 'contours',
+	'ContourPaths': 'contours',
+	'grid_center_to_edge_coordinates': 'coords',
+	'grid_edge_to_center_coordinates': 'coords',
+	'render_many': 'batch',
+	'RenderCache': 'cache',
+}
+
+_SUBMODULES = ['colors', 'common', 'coords', 'frame', 'multi', 'utils',
+				'xy', 'histogram', 'grid', 'batch', 'cache', 'decimate',
+				'labels', 'density', 'pyramid', 'stats', 'contours',
+				'layout']
+
+__all__ = sorted(_LAZY_ATTRS.keys())
+
 
 ## Reloading mechanism
 try:
@@ -22,58 +58,52 @@ else:
 		pass
 
 
-## Import submodules
+def _load_submodule(name):
+	"""
+	Import (or reload) submodule
 
-## colors (no internal dependencies)
-if not reloading:
-	from . import colors
-else:
-	reload(colors)
+	:param name:
+		str, submodule name
 
-## common (no internal dependencies)
-if not reloading:
-	from . import common
-else:
-	reload(common)
-from .common import *
+	:return:
+		module
+	"""
+	full_name = '%s.%s' % (__name__, name)
+	if reloading and full_name in sys.modules:
+		module = reload(sys.modules[full_name])
+	else:
+		module = importlib.import_module(full_name)
+	globals()[name] = module
+	return module
 
-## frame (no internal dependencies)
-if not reloading:
-	from . import frame
-else:
-	reload(frame)
-from .frame import *
 
-## multi (no internal dependencies)
-if not reloading:
-	from . import multi
-else:
-	reload(multi)
-from .multi import *
+def __getattr__(name):
+	"""
+	Lazily import submodules and public functions on first access
+	"""
+	if name in _LAZY_ATTRS:
+		module = _load_submodule(_LAZY_ATTRS[name])
+		value = getattr(module, name)
+		globals()[name] = value
+		return value
+	elif name in _SUBMODULES:
+		return _load_submodule(name)
+	raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-## utils (no internal dependencies)
-if not reloading:
-	from . import utils
-else:
-	reload(utils)
 
-## xy (depends on common, frame)
-if not reloading:
-	from . import xy
-else:
-	reload(xy)
-from .xy import *
+def __dir__():
+	return sorted(set(globals().keys()) | set(_LAZY_ATTRS.keys())
+				| set(_SUBMODULES))
 
-## histogram (depends on common, frame)
-if not reloading:
-	from . import histogram
-else:
-	reload(histogram)
-from .histogram import *
 
-## grid (depends on common, frame)
-if not reloading:
-	from . import grid
-else:
-	reload(grid)
-from .grid import *
+if reloading:
+	## Drop cached names, so they are reloaded on next access
+	for _name in list(_LAZY_ATTRS.keys()) + _SUBMODULES:
+		globals().pop(_name, None)
+
+if sys.version_info[:2] < (3, 7):
+	## No module __getattr__ support, import everything eagerly
+	for _name in _SUBMODULES:
+		_load_submodule(_name)
+	for _name, _module_name in _LAZY_ATTRS.items():
+		globals()[_name] = getattr(globals()[_module_name], _name)
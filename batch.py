@@ -0,0 +1,171 @@
+"""
+Batch rendering of plots in a pool of worker processes
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+try:
+	## Python 2
+	basestring
+except:
+	## Python 3
+	basestring = str
+
+import importlib
+import traceback
+from collections import namedtuple
+
+
+__all__ = ['render_many']
+
+
+## Outcome of a single render job
+RenderResult = namedtuple('RenderResult', ['index', 'func_name', 'fig_filespec',
+										'success', 'error'])
+
+
+def _init_worker():
+	"""
+	Worker initializer: select the Agg backend and import matplotlib
+	and the plot modules once, rather than for every job
+	"""
+	import matplotlib
+	matplotlib.use('Agg')
+
+	package = importlib.import_module(__package__)
+	for module_name in ('xy', 'histogram', 'grid'):
+		getattr(package, module_name)
+
+
+def _parse_spec(spec):
+	"""
+	Parse plot specification
+
+	:param spec:
+		dict with keys 'func', 'kwargs' and 'fig_filespec'
+		or (func_name, kwargs, fig_filespec) tuple
+
+	:return:
+		(func_name, kwargs, fig_filespec) tuple
+	"""
+	if isinstance(spec, dict):
+		func_name = spec['func']
+		kwargs = spec.get('kwargs', {})
+		fig_filespec = spec.get('fig_filespec', kwargs.get('fig_filespec'))
+	else:
+		func_name, kwargs, fig_filespec = spec
+
+	if not isinstance(func_name, basestring):
+		## Allow passing the function itself
+		func_name = func_name.__name__
+	if not fig_filespec or fig_filespec == 'wait':
+		raise ValueError('Batch rendering requires output file for %s'
+						% func_name)
+
+	return (func_name, kwargs, fig_filespec)
+
+
+def _render_job(func_name, kwargs, fig_filespec):
+	"""
+	Render single plot in headless mode
+
+	:param func_name:
+		str, name of plot function in this package
+	:param kwargs:
+		dict, keyword arguments for plot function
+	:param fig_filespec:
+		str, full path to output file
+
+	:return:
+		None if successful, else str, formatted traceback
+	"""
+	try:
+		package = importlib.import_module(__package__)
+		plot_func = getattr(package, func_name)
+		kwargs = dict(kwargs, fig_filespec=fig_filespec, headless=True)
+		plot_func(**kwargs)
+	except Exception:
+		## Return traceback as string, exceptions are not always picklable
+		return traceback.format_exc()
+
+
+def render_many(specs, workers=None, cache=None):
+	"""
+	Render many plots to file, distributing them over a pool of
+	worker processes. Each plot is rendered in headless mode
+	(see :func:`show_or_save_plot`)
+
+	:param specs:
+		list of plot specifications, either dicts with keys:
+		- 'func': str, name of plot function (e.g., 'plot_xy', 'plot_grid')
+		- 'kwargs': dict, keyword arguments for plot function
+		- 'fig_filespec': str, full path to output file
+		  (may also be specified in 'kwargs')
+		or (func_name, kwargs, fig_filespec) tuples
+	:param workers:
+		int, number of worker processes
+		If 1, plots will be rendered sequentially in the current process
+		(default: None, will use number of CPUs)
+	:param cache:
+		instance of :class:`RenderCache`, cache to copy previously
+		rendered plots from, and to store newly rendered plots in
+		(default: None)
+
+	:return:
+		list with instance of :class:`RenderResult` for each spec
+		(in the same order), with 'success' set to False and 'error'
+		containing the formatted traceback if rendering failed
+	"""
+	jobs = []
+	cache_keys = {}
+	results = [None] * len(specs)
+	for i, spec in enumerate(specs):
+		try:
+			func_name, kwargs, fig_filespec = _parse_spec(spec)
+			if cache is not None:
+				## Plots with unhashable arguments are rendered without cache
+				key = cache.get_key(func_name, kwargs, fig_filespec,
+									ignore_unhashable=True)
+				if key is not None:
+					if cache.fetch(key, fig_filespec):
+						results[i] = RenderResult(i, func_name, fig_filespec, True,
+												None)
+						continue
+					cache_keys[i] = key
+		except Exception:
+			func_name = spec.get('func') if isinstance(spec, dict) else None
+			results[i] = RenderResult(i, func_name, None, False,
+									traceback.format_exc())
+		else:
+			jobs.append((i, (func_name, kwargs, fig_filespec)))
+
+	if workers == 1:
+		## Note: headless mode does not need backend selection
+		for i, (func_name, kwargs, fig_filespec) in jobs:
+			error = _render_job(func_name, kwargs, fig_filespec)
+			results[i] = RenderResult(i, func_name, fig_filespec, error is None,
+									error)
+
+	else:
+		from concurrent.futures import ProcessPoolExecutor
+
+		with ProcessPoolExecutor(max_workers=workers,
+								initializer=_init_worker) as executor:
+			futures = [(i, func_name, fig_filespec,
+						executor.submit(_render_job, func_name, kwargs, fig_filespec))
+						for i, (func_name, kwargs, fig_filespec) in jobs]
+			for i, func_name, fig_filespec, future in futures:
+				try:
+					error = future.result()
+				except Exception:
+					## E.g., worker process died or arguments not picklable
+					error = traceback.format_exc()
+				results[i] = RenderResult(i, func_name, fig_filespec, error is None,
+										error)
+
+	if cache is not None:
+		for i, key in cache_keys.items():
+			if results[i].success:
+				cache.store(key, results[i].fig_filespec)
+
+	return results
@@ -0,0 +1,274 @@
+"""
+Content-addressed cache for rendered plots
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+try:
+	## Python 2
+	basestring
+except:
+	## Python 3
+	basestring = str
+
+import os
+import pickle
+import shutil
+import hashlib
+import datetime
+import importlib
+
+import numpy as np
+import matplotlib
+import matplotlib.colors
+
+
+__all__ = ['RenderCache']
+
+
+def _update_hash(hasher, obj):
+	"""
+	Feed object into hash, recursing into containers.
+	numpy arrays are hashed directly over their buffer (without copying
+	if they are contiguous), datetime64 and timedelta64 arrays over
+	their integer representation
+
+	:param hasher:
+		hashlib hash object
+	:param obj:
+		any object
+	"""
+	if isinstance(obj, np.ndarray):
+		if isinstance(obj, np.ma.MaskedArray):
+			hasher.update(b'masked')
+			_update_hash(hasher, np.ma.getmaskarray(obj))
+			obj = obj.data
+		hasher.update(('ndarray%s%s' % (obj.dtype.str, obj.shape)).encode('ascii'))
+		if obj.dtype.hasobject:
+			_update_hash(hasher, obj.tolist())
+		elif obj.dtype.kind in 'mM':
+			## datetime64 / timedelta64 do not support the buffer protocol,
+			## hash their integer representation (unit is in dtype string)
+			hasher.update(memoryview(np.ascontiguousarray(obj.view('i8'))).cast('B'))
+		else:
+			hasher.update(memoryview(np.ascontiguousarray(obj)).cast('B'))
+	elif isinstance(obj, (list, tuple)):
+		hasher.update(('%s%d' % (type(obj).__name__, len(obj))).encode('ascii'))
+		for item in obj:
+			_update_hash(hasher, item)
+	elif isinstance(obj, dict):
+		hasher.update(('dict%d' % len(obj)).encode('ascii'))
+		for key in sorted(obj.keys(), key=repr):
+			_update_hash(hasher, key)
+			_update_hash(hasher, obj[key])
+	elif obj is None or isinstance(obj, (bool, int, float, basestring, bytes,
+										np.number, np.bool_, datetime.date,
+										datetime.time, datetime.timedelta)):
+		hasher.update(('%s:%r' % (type(obj).__name__, obj)).encode('utf-8'))
+	elif isinstance(obj, matplotlib.colors.Colormap):
+		## Colormaps are hashed by their colors, not by identity
+		hasher.update(b'cmap')
+		_update_hash(hasher, obj(np.arange(obj.N)))
+		_update_hash(hasher, [obj.get_bad(), obj.get_under(), obj.get_over()])
+	else:
+		## Other objects (norms, formatters, ...): pickled state
+		hasher.update(type(obj).__name__.encode('ascii'))
+		hasher.update(pickle.dumps(obj, protocol=2))
+
+
+class RenderCache(object):
+	"""
+	On-disk cache of rendered plots, addressed by a hash of the plot
+	function name and its arguments (including data arrays).
+	Files are evicted in least-recently-used order when the total
+	size of the cache exceeds :param:`max_size`
+
+	:param cache_dir:
+		str, full path to cache directory (will be created if necessary)
+	:param max_size:
+		int, maximum total size of cached files in bytes
+		(default: 1E+9)
+
+	Counters:
+	:attr hits:
+		int, number of plots served from the cache
+	:attr misses:
+		int, number of plots that had to be rendered
+	:attr evictions:
+		int, number of files removed from the cache
+	:attr bypasses:
+		int, number of plots rendered without the cache, because their
+		arguments could not be hashed
+	"""
+	def __init__(self, cache_dir, max_size=1E+9):
+		self.cache_dir = cache_dir
+		self.max_size = max_size
+		self.hits = self.misses = self.evictions = self.bypasses = 0
+		if not os.path.exists(cache_dir):
+			os.makedirs(cache_dir)
+		self._size = sum(os.path.getsize(filespec)
+						for filespec in self._list_cached_files())
+
+	def _list_cached_files(self):
+		return [os.path.join(self.cache_dir, filename)
+				for filename in os.listdir(self.cache_dir)
+				if not filename.startswith('.')]
+
+	def _get_cached_filespec(self, key, fig_filespec):
+		ext = os.path.splitext(fig_filespec)[1].lower()
+		return os.path.join(self.cache_dir, key + ext)
+
+	def get_key(self, func_name, kwargs, fig_filespec, ignore_unhashable=False):
+		"""
+		Compute cache key
+
+		:param func_name:
+			str, name of plot function
+		:param kwargs:
+			dict, keyword arguments for plot function
+			(:param:`fig_filespec` and 'headless' are ignored)
+		:param fig_filespec:
+			str, full path to output file (only extension is used)
+		:param ignore_unhashable:
+			bool, whether to return None rather than raise an error if
+			arguments cannot be hashed because they cannot be pickled
+			(e.g., lambda functions) or do not expose their data (arrays
+			with other dtypes). This is counted in :attr:`bypasses`
+			(default: False)
+
+		:return:
+			str, hexadecimal hash
+		"""
+		if kwargs.get('ax') is not None:
+			raise ValueError('Plots drawn in existing axes cannot be cached')
+		kwargs = {key: val for (key, val) in kwargs.items()
+				if not key in ('fig_filespec', 'headless')}
+
+		hasher = hashlib.sha1()
+		try:
+			_update_hash(hasher, [matplotlib.__version__, func_name,
+								os.path.splitext(fig_filespec)[1].lower(), kwargs])
+		except (pickle.PicklingError, TypeError, AttributeError, ValueError):
+			if not ignore_unhashable:
+				raise
+			self.bypasses += 1
+			return None
+		return hasher.hexdigest()
+
+	def fetch(self, key, fig_filespec):
+		"""
+		Copy cached plot to output file if it exists
+
+		:param key:
+			str, cache key
+		:param fig_filespec:
+			str, full path to output file
+
+		:return:
+			bool, whether or not plot was found in cache
+		"""
+		cached_filespec = self._get_cached_filespec(key, fig_filespec)
+		try:
+			shutil.copyfile(cached_filespec, fig_filespec)
+		except (IOError, OSError):
+			if os.path.exists(cached_filespec):
+				raise
+			self.misses += 1
+			return False
+		else:
+			## Mark as recently used, unless removed by another process
+			try:
+				os.utime(cached_filespec, None)
+			except OSError:
+				pass
+			self.hits += 1
+			return True
+
+	def store(self, key, fig_filespec):
+		"""
+		Add rendered plot to cache
+
+		:param key:
+			str, cache key
+		:param fig_filespec:
+			str, full path to rendered file
+		"""
+		cached_filespec = self._get_cached_filespec(key, fig_filespec)
+		## Copy to temporary file first, so readers never see partial files
+		tmp_filespec = os.path.join(self.cache_dir, '.%s.%d.tmp' % (key, os.getpid()))
+		shutil.copyfile(fig_filespec, tmp_filespec)
+		## Size of file that is overwritten, if any
+		try:
+			old_size = os.path.getsize(cached_filespec)
+		except OSError:
+			old_size = 0
+		os.replace(tmp_filespec, cached_filespec)
+		self._size += os.path.getsize(cached_filespec) - old_size
+		if self._size > self.max_size:
+			self.evict()
+
+	def evict(self):
+		"""
+		Remove least recently used files until total size of cache
+		no longer exceeds :attr:`max_size`
+		"""
+		files = []
+		for filespec in self._list_cached_files():
+			try:
+				stat = os.stat(filespec)
+			except OSError:
+				## Removed by another process
+				continue
+			files.append((stat.st_mtime, stat.st_size, filespec))
+		files.sort()
+
+		self._size = sum(size for (_, size, _) in files)
+		for (_, size, filespec) in files:
+			if self._size <= self.max_size:
+				break
+			try:
+				os.remove(filespec)
+			except OSError:
+				pass
+			else:
+				self.evictions += 1
+			self._size -= size
+
+	def clear(self):
+		"""
+		Remove all files from cache
+		"""
+		for filespec in self._list_cached_files():
+			os.remove(filespec)
+		self._size = 0
+
+	def render(self, plot_func, **kwargs):
+		"""
+		Render plot to file, or copy it from the cache if the same plot
+		has been rendered before. Plots with arguments that cannot be
+		hashed (e.g., lambda functions) are rendered without the cache
+
+		:param plot_func:
+			str (name of plot function in this package) or plot function
+		:param kwargs:
+			keyword arguments for plot function, :param:`fig_filespec`
+			must be full path to output file
+
+		:return:
+			None
+		"""
+		fig_filespec = kwargs.get('fig_filespec')
+		if not fig_filespec or fig_filespec == 'wait':
+			raise ValueError('Cached rendering requires output file')
+
+		if isinstance(plot_func, basestring):
+			package = importlib.import_module(__package__)
+			plot_func = getattr(package, plot_func)
+		func_name = plot_func.__name__
+
+		key = self.get_key(func_name, kwargs, fig_filespec, ignore_unhashable=True)
+		if key is None:
+			plot_func(**kwargs)
+		elif not self.fetch(key, fig_filespec):
+			plot_func(**kwargs)
+			self.store(key, fig_filespec)
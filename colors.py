@@ -12,8 +12,21 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 _all__ = ['get_random_colors', 'get_spaced_colors', 'DEFAULT_COLORS']
 
 
-import pylab
-DEFAULT_COLORS = pylab.rcParams['axes.prop_cycle'].by_key()['color']
+def __getattr__(name):
+	"""
+	Lazy module attributes (Python 3.7+), so that importing this module
+	does not require importing matplotlib
+
+	:param name:
+		str, attribute name
+
+	:return:
+		attribute value
+	"""
+	if name == 'DEFAULT_COLORS':
+		import matplotlib
+		return matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+	raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 def get_random_colors(num_colors, color_table='css4', random_seed=None):
@@ -12,8 +12,12 @@ except:
 	basestring = str
 
 
+import inspect
+import functools
+import threading
+import contextlib
+
 import matplotlib
-import pylab
 
 
 __all__ = ['show_or_save_plot']
@@ -67,6 +71,21 @@ common_doc = """
 		matplotlib Axes instance, in which plot will be drawn
 		If specified, :param:`fig_filespec` will be overridden with 'wait'
 		(default: None, will generate new Axes instance)
+	:param headless:
+		bool, whether or not to render without pyplot, i.e. on a plain
+		matplotlib Figure with an Agg canvas, which is not registered
+		with the pyplot figure manager. The style sheet is only applied
+		while the plot is being created and saved, so that independent
+		plots can be rendered in parallel threads.
+		Note that matplotlib reads many style settings from the global
+		rcParams while drawing, so the style sheet is still applied
+		globally during that time (see :func:`shared_style_context`):
+		headless plots with different style sheets are rendered one
+		at a time, and non-headless plots drawn in other threads
+		meanwhile will use the style sheet as well.
+		Plots cannot be shown on screen in this mode, so if
+		:param:`fig_filespec` is None, it will behave as 'wait'
+		(default: False)
 
 	:return:
 		matplotlib Axes instance if :param:`fig_filespec` is either None
@@ -74,7 +93,134 @@ common_doc = """
 """
 
 
-def show_or_save_plot(ax_or_fig, fig_filespec=None, dpi=300, border_width=0.2):
+## Style sheet shared by all headless plots currently being rendered
+_STYLE_CONDITION = threading.Condition()
+_ACTIVE_STYLE = {'style_sheet': None, 'num_users': 0, 'rc': None}
+
+
+@contextlib.contextmanager
+def shared_style_context(style_sheet):
+	"""
+	Context manager applying a matplotlib style sheet for the duration
+	of a (headless) plot, and restoring the original rcParams afterwards.
+	Threads using the same style sheet share it, threads requesting
+	a different style sheet wait until it is no longer in use.
+
+	The style sheet cannot be applied per figure, because matplotlib
+	reads global rcParams not only when artists are created, but also
+	when they are drawn (e.g., ticks, tick label formatting, text and
+	path rendering). Hence, the global rcParams are modified while the
+	context is active, which also affects plots created or drawn
+	outside this context (e.g., in other threads) in the meantime.
+
+	:param style_sheet:
+		str, dict or list, matplotlib style specification
+	"""
+	import matplotlib.style
+
+	with _STYLE_CONDITION:
+		while (_ACTIVE_STYLE['num_users']
+				and _ACTIVE_STYLE['style_sheet'] != style_sheet):
+			_STYLE_CONDITION.wait()
+		if _ACTIVE_STYLE['num_users'] == 0:
+			rc = dict(matplotlib.rcParams.copy())
+			del rc['backend']
+			_ACTIVE_STYLE['rc'] = rc
+			_ACTIVE_STYLE['style_sheet'] = style_sheet
+			matplotlib.style.use(style_sheet)
+		_ACTIVE_STYLE['num_users'] += 1
+
+	try:
+		yield
+	finally:
+		with _STYLE_CONDITION:
+			_ACTIVE_STYLE['num_users'] -= 1
+			if _ACTIVE_STYLE['num_users'] == 0:
+				## Bypass validation, like matplotlib.rc_context
+				dict.update(matplotlib.rcParams, _ACTIVE_STYLE['rc'])
+				_ACTIVE_STYLE['style_sheet'] = _ACTIVE_STYLE['rc'] = None
+				_STYLE_CONDITION.notify_all()
+
+
+def headless_aware(plot_func):
+	"""
+	Decorator for plot functions having 'style_sheet' and 'headless'
+	arguments, wrapping headless calls in :func:`shared_style_context`.
+	Note that the decorated function should not apply the style sheet
+	itself if :param:`headless` is True.
+	"""
+	signature = inspect.signature(plot_func)
+	headless_default = signature.parameters['headless'].default
+	style_sheet_default = signature.parameters['style_sheet'].default
+
+	@functools.wraps(plot_func)
+	def wrapper(*args, **kwargs):
+		arguments = signature.bind(*args, **kwargs).arguments
+		if arguments.get('headless', headless_default):
+			style_sheet = arguments.get('style_sheet', style_sheet_default)
+			with shared_style_context(style_sheet):
+				return plot_func(*args, **kwargs)
+		else:
+			return plot_func(*args, **kwargs)
+
+	return wrapper
+
+
+def create_fig_and_ax(figsize=None, headless=False):
+	"""
+	Create new figure with a single Axes instance
+
+	:param figsize:
+		(width, height) tuple of floats, plot size in inches
+		(default: None)
+	:param headless:
+		bool, whether to create a plain Figure with an Agg canvas (True)
+		or a pyplot figure (False)
+		(default: False)
+
+	:return:
+		(fig, ax) tuple
+	"""
+	if headless:
+		from matplotlib.figure import Figure
+		from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+		fig = Figure(figsize=figsize, facecolor='white')
+		FigureCanvasAgg(fig)
+		ax = fig.add_subplot(111)
+	else:
+		import pylab
+
+		fig, ax = pylab.subplots(figsize=figsize, facecolor='white')
+
+	return (fig, ax)
+
+
+def get_ax_pixel_size(ax, dpi=None):
+	"""
+	Determine size of Axes in output pixels
+
+	:param ax:
+		matplotlib Axes instance
+	:param dpi:
+		int, output resolution
+		(default: None, will use resolution of figure)
+
+	:return:
+		(width, height) tuple of ints
+	"""
+	fig = ax.get_figure()
+	dpi = dpi or fig.dpi
+	fig_width, fig_height = fig.get_size_inches()
+	ax_pos = ax.get_position()
+	width = int(round(ax_pos.width * fig_width * dpi))
+	height = int(round(ax_pos.height * fig_height * dpi))
+
+	return (width, height)
+
+
+def show_or_save_plot(ax_or_fig, fig_filespec=None, dpi=300, border_width=0.2,
+					headless=False):
 	"""
 	Show plot on screen or save it to a file
 
@@ -93,28 +239,41 @@ def show_or_save_plot(ax_or_fig, fig_filespec=None, dpi=300, border_width=0.2):
 		float, width of border around plot frame in cm
 		If None, white space will not be removed
 		(default: 0.2)
+	:param headless:
+		bool, whether or not figure was created in headless mode,
+		in which case pyplot state is left alone, and :param:`fig_filespec`
+		None is treated as 'wait'
+		(default: False)
 
 	:return:
 		matplotlib Axes or Figure instance if :param:`fig_filespec` is
 		either None or 'wait', else None
 	"""
+	import matplotlib.figure
+
 	if isinstance(ax_or_fig, matplotlib.figure.Figure):
 		fig = ax_or_fig
 	else:
 		fig = ax_or_fig.get_figure()
 
-	if fig_filespec == "wait":
+	if fig_filespec == "wait" or (headless and not fig_filespec):
 		return ax_or_fig
 	elif fig_filespec:
 		kwargs = {}
 		if border_width is not None:
 			kwargs = dict(bbox_inches="tight", pad_inches=border_width/2.54)
 		fig.savefig(fig_filespec, dpi=dpi, **kwargs)
+		if headless:
+			return
+
+		import pylab
 		pylab.clf()
 
 		## Restore default style if we get here
 		pylab.style.use('default')
 	else:
+		import pylab
+
 		## Note, using fig.show(), the plot disappears immediately!
 		#fig.show()
 		pylab.show()
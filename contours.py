@@ -0,0 +1,253 @@
+"""
+Contour lines of gridded data, computed independently of matplotlib
+Axes, so that they can be cached, saved and drawn on several plots
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+import numpy as np
+
+from .stats import GridStats
+
+
+__all__ = ['compute_contours', 'ContourPaths']
+
+
+class ContourPaths(object):
+	"""
+	Contour lines of gridded data, with precomputed label positions
+
+	:param levels:
+		1-D float array, contour levels
+	:param vertices:
+		(num_vertices, 2) float array, X/Y coordinates of the vertices
+		of all lines, concatenated
+	:param line_offsets:
+		1-D int array (num_lines + 1), index of first vertex of each
+		line in :param:`vertices`, followed by the number of vertices
+	:param line_levels:
+		1-D int array (num_lines), index of level of each line
+	:param label_positions:
+		(num_labels, 2) float array, X/Y coordinates of labels
+		(default: None)
+	:param label_directions:
+		(num_labels, 2) float array, X/Y components of the line
+		direction at each label position (in data units)
+		(default: None)
+	:param label_levels:
+		1-D int array (num_labels), index of level of each label
+		(default: None)
+	"""
+	_ARRAYS = ['levels', 'vertices', 'line_offsets', 'line_levels',
+				'label_positions', 'label_directions', 'label_levels']
+
+	def __init__(self, levels, vertices, line_offsets, line_levels,
+				label_positions=None, label_directions=None, label_levels=None):
+		self.levels = np.asarray(levels, dtype=np.float64)
+		self.vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+		self.line_offsets = np.asarray(line_offsets, dtype=np.int64)
+		self.line_levels = np.asarray(line_levels, dtype=np.int64)
+		if label_positions is None:
+			label_positions = np.empty((0, 2))
+			label_directions = np.empty((0, 2))
+			label_levels = np.array([], dtype=np.int64)
+		self.label_positions = np.asarray(label_positions,
+										dtype=np.float64).reshape(-1, 2)
+		self.label_directions = np.asarray(label_directions,
+										dtype=np.float64).reshape(-1, 2)
+		self.label_levels = np.asarray(label_levels, dtype=np.int64)
+
+	def __repr__(self):
+		return '<ContourPaths: %d levels, %d lines, %d vertices>' % (
+				len(self.levels), self.num_lines, len(self.vertices))
+
+	@property
+	def num_lines(self):
+		return len(self.line_levels)
+
+	def get_lines(self, level_idx=None):
+		"""
+		Get vertices of contour lines
+
+		:param level_idx:
+			int, index of contour level
+			(default: None, will return lines of all levels)
+
+		:return:
+			list of (num_vertices, 2) float arrays (views)
+		"""
+		if level_idx is None:
+			line_idxs = range(self.num_lines)
+		else:
+			line_idxs = np.flatnonzero(self.line_levels == level_idx)
+		return [self.vertices[self.line_offsets[i]:self.line_offsets[i+1]]
+				for i in line_idxs]
+
+	def save(self, npz_filespec):
+		"""
+		Save contours to compressed .npz file
+
+		:param npz_filespec:
+			str, full path to output file
+		"""
+		np.savez_compressed(npz_filespec, **{name: getattr(self, name)
+											for name in self._ARRAYS})
+
+	@classmethod
+	def load(cls, npz_filespec):
+		"""
+		Load contours from .npz file saved with :meth:`save`
+
+		:param npz_filespec:
+			str, full path to .npz file
+
+		:return:
+			instance of :class:`ContourPaths`
+		"""
+		with np.load(npz_filespec, allow_pickle=False) as npz:
+			kwargs = {name: npz[name] for name in cls._ARRAYS}
+		return cls(**kwargs)
+
+
+def _get_contour_levels(stats, num_levels):
+	"""
+	Determine contour levels in the same way as matplotlib's contour
+	function if only the number of levels is given
+
+	:param stats:
+		instance of :class:`GridStats`, statistics of gridded data
+	:param num_levels:
+		int, (maximum) number of levels
+
+	:return:
+		1-D float array
+	"""
+	from matplotlib.ticker import MaxNLocator
+
+	levels = MaxNLocator(num_levels + 1).tick_values(stats.min, stats.max)
+	## Only levels strictly inside data range
+	inside = (levels > stats.min) & (levels < stats.max)
+	if inside.any():
+		return levels[inside]
+	else:
+		return np.array([stats.min])
+
+
+def _get_label_positions(lines, label_spacing, min_label_length):
+	"""
+	Select label positions at regular distances along contour lines
+
+	:param lines:
+		list of (num_vertices, 2) float arrays
+	:param label_spacing:
+		float, distance between labels along a line (in data units)
+	:param min_label_length:
+		float, minimum length of lines to be labeled (in data units)
+
+	:return:
+		(positions, directions, line_idxs) tuple of arrays
+	"""
+	positions, directions, line_idxs = [], [], []
+	for i, line in enumerate(lines):
+		if len(line) < 2:
+			continue
+		seg_lengths = np.hypot(*np.diff(line, axis=0).T)
+		dist = np.concatenate([[0], np.cumsum(seg_lengths)])
+		length = dist[-1]
+		if length < min_label_length or length == 0:
+			continue
+		## Labels centered on line, spaced label_spacing apart
+		num_labels = max(1, int(length // label_spacing))
+		label_dist = (length - (num_labels - 1) * label_spacing) / 2.
+		label_dist += np.arange(num_labels) * label_spacing
+		seg_idxs = np.clip(np.searchsorted(dist, label_dist) - 1, 0,
+							len(seg_lengths) - 1)
+		frac = ((label_dist - dist[seg_idxs])
+				/ np.where(seg_lengths[seg_idxs] > 0, seg_lengths[seg_idxs], 1))
+		seg_dirs = line[seg_idxs + 1] - line[seg_idxs]
+		positions.append(line[seg_idxs] + frac[:, np.newaxis] * seg_dirs)
+		directions.append(seg_dirs)
+		line_idxs.append(np.full(num_labels, i))
+
+	if positions:
+		return (np.concatenate(positions), np.concatenate(directions),
+				np.concatenate(line_idxs))
+	else:
+		return (np.empty((0, 2)), np.empty((0, 2)), np.array([], dtype=int))
+
+
+def compute_contours(data, levels, X=None, Y=None, label_spacing=None,
+					min_label_length=None, stats=None):
+	"""
+	Compute contour lines of gridded data, without drawing them.
+	The result can be passed as :param:`contour_lines` to
+	:func:`plot_grid`, possibly for several plots, and can be saved
+
+	:param data:
+		2D array, gridded data (NaN and masked values are ignored)
+	:param levels:
+		int, number of levels (chosen as in matplotlib's contour),
+		or list or array, contour levels
+	:param X:
+	:param Y:
+		1D arrays or 2D arrays, X/Y center coordinates of grid
+		(default: None, will use column/row indexes)
+	:param label_spacing:
+		float, distance between labels along contour lines (in data
+		units)
+		(default: None, will use 1/3 of the diagonal of the grid extent)
+	:param min_label_length:
+		float, minimum length of contour lines to be labeled (in data
+		units)
+		(default: None, will use 1/20 of the diagonal of the grid extent)
+	:param stats:
+		instance of :class:`GridStats`, statistics used to determine
+		the levels if :param:`levels` is a number, e.g. of the full
+		resolution grid if :param:`data` is a reduced version of it
+		(default: None, will compute statistics of :param:`data`)
+
+	:return:
+		instance of :class:`ContourPaths`
+	"""
+	import contourpy
+
+	data = np.ma.masked_invalid(data, copy=False)
+	ny, nx = data.shape
+	if X is None and Y is None:
+		X, Y = np.arange(nx, dtype=np.float64), np.arange(ny, dtype=np.float64)
+	X, Y = np.asarray(X), np.asarray(Y)
+
+	if np.isscalar(levels):
+		if stats is None:
+			stats = GridStats(data, sample_size=None)
+		levels = _get_contour_levels(stats, int(levels))
+	levels = np.asarray(levels, dtype=np.float64)
+
+	generator = contourpy.contour_generator(X, Y, data, line_type='Separate')
+	lines, line_levels = [], []
+	for l, level in enumerate(levels):
+		level_lines = generator.lines(level)
+		lines.extend(level_lines)
+		line_levels.extend([l] * len(level_lines))
+
+	line_offsets = np.concatenate([[0], np.cumsum([len(line) for line in lines],
+												dtype=np.int64)])
+	if lines:
+		vertices = np.concatenate(lines)
+	else:
+		vertices = np.empty((0, 2))
+
+	## Label positions
+	diagonal = np.hypot(np.ptp(X), np.ptp(Y))
+	if label_spacing is None:
+		label_spacing = diagonal / 3.
+	if min_label_length is None:
+		min_label_length = diagonal / 20.
+	(label_positions, label_directions,
+		label_line_idxs) = _get_label_positions(lines, label_spacing,
+												min_label_length)
+	label_levels = np.asarray(line_levels, dtype=np.int64)[label_line_idxs]
+
+	return ContourPaths(levels, vertices, line_offsets, line_levels,
+						label_positions, label_directions, label_levels)
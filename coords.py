@@ -0,0 +1,241 @@
+"""
+Grid (or mesh) coordinate transforms
+
+Only depends on numpy, so these functions can be used without
+importing matplotlib
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+import numpy as np
+
+
+__all__ = ['grid_center_to_edge_coordinates',
+			'grid_edge_to_center_coordinates']
+
+
+def _get_float_dtype(*arrays):
+	"""
+	Determine floating-point dtype for transformed coordinates,
+	preserving the dtype of floating-point input arrays
+
+	:param arrays:
+		numpy arrays
+
+	:return:
+		numpy dtype
+	"""
+	dtype = np.result_type(*arrays)
+	if not np.issubdtype(dtype, np.floating):
+		dtype = np.dtype(np.float64)
+	return dtype
+
+
+def _reduce_constant_axes(C):
+	"""
+	Reduce broadcast (zero-stride) axes of coordinate array to length 1,
+	so that coordinates that are constant along an axis (e.g., X in
+	rectilinear grids, or grids shared by all members of a stack) are
+	transformed only once
+
+	:param C:
+		array (... x num_lats x num_lons), center or edge coordinates
+
+	:return:
+		array (view)
+	"""
+	for axis in range(C.ndim):
+		if C.shape[axis] > 1 and C.strides[axis] == 0:
+			idx = [slice(None)] * C.ndim
+			idx[axis] = slice(0, 1)
+			C = C[tuple(idx)]
+	return C
+
+
+def _center_to_edge(C, out):
+	"""
+	Compute edge coordinates from center coordinates of one coordinate
+	array. Interior edges are the mean of the 4 surrounding centers,
+	outer edges are extrapolated linearly. Axes of length 1 are
+	considered constant
+
+	:param C:
+		array (... x num_lats x num_lons), center coordinates
+	:param out:
+		array (... x num_lats+1 x num_lons+1), edge coordinates,
+		or with length 1 along constant axes
+	"""
+	ny, nx = C.shape[-2:]
+	if ny == 1 and nx == 1:
+		out[...] = C
+
+	elif ny == 1 or nx == 1:
+		## Constant along one axis: 1D transform along the other axis
+		if nx == 1:
+			C, out = np.swapaxes(C, -1, -2), np.swapaxes(out, -1, -2)
+		np.add(C[..., :-1], C[..., 1:], out=out[..., 1:-1])
+		out[..., 1:-1] *= 0.5
+		out[..., :1] = 1.5 * C[..., :1] - 0.5 * C[..., 1:2]
+		out[..., -1:] = 1.5 * C[..., -1:] - 0.5 * C[..., -2:-1]
+
+	else:
+		## Interior edges
+		interior = out[..., 1:-1, 1:-1]
+		np.add(C[..., :-1, :-1], C[..., 1:, :-1], out=interior)
+		interior += C[..., :-1, 1:]
+		interior += C[..., 1:, 1:]
+		interior *= 0.25
+
+		## Outer rows (including corners) are extrapolated along Y first
+		row = 1.5 * C[..., :1, :] - 0.5 * C[..., 1:2, :]
+		_center_to_edge(row, out[..., :1, :])
+		row = 1.5 * C[..., -1:, :] - 0.5 * C[..., -2:-1, :]
+		_center_to_edge(row, out[..., -1:, :])
+
+		## Outer columns (excluding corners) are extrapolated along X first
+		col = 1.5 * C[..., :, :1] - 0.5 * C[..., :, 1:2]
+		np.add(col[..., :-1, :], col[..., 1:, :], out=out[..., 1:-1, :1])
+		out[..., 1:-1, :1] *= 0.5
+		col = 1.5 * C[..., :, -1:] - 0.5 * C[..., :, -2:-1]
+		np.add(col[..., :-1, :], col[..., 1:, :], out=out[..., 1:-1, -1:])
+		out[..., 1:-1, -1:] *= 0.5
+
+
+def _edge_to_center(E, out):
+	"""
+	Compute center coordinates from edge coordinates of one coordinate
+	array as the mean of the 4 surrounding edges. Axes of length 1 are
+	considered constant
+
+	:param E:
+		array (... x num_lats x num_lons), edge coordinates
+	:param out:
+		array (... x num_lats-1 x num_lons-1), center coordinates,
+		or with length 1 along constant axes
+	"""
+	corners = [E]
+	for axis in (-2, -1):
+		if E.shape[axis] > 1:
+			lo, hi = [slice(None)] * E.ndim, [slice(None)] * E.ndim
+			lo[axis], hi[axis] = slice(None, -1), slice(1, None)
+			corners = ([C[tuple(lo)] for C in corners]
+						+ [C[tuple(hi)] for C in corners])
+
+	out[...] = corners[0]
+	for C in corners[1:]:
+		out += C
+	if len(corners) > 1:
+		out *= 1. / len(corners)
+
+
+def _transform_coordinates(transform, X, Y, shape, out):
+	"""
+	Apply coordinate transform to X and Y arrays
+
+	:param transform:
+		function, :func:`_center_to_edge` or :func:`_edge_to_center`
+	:param X:
+	:param Y:
+		arrays (... x num_lats x num_lons), input coordinates
+	:param shape:
+		tuple, shape of output arrays
+	:param out:
+		(X, Y) tuple of output arrays or None
+
+	:return:
+		(X, Y) tuple of output arrays
+	"""
+	dtype = _get_float_dtype(X, Y)
+	if out is not None and not (out[0].shape == out[1].shape == shape):
+		raise ValueError('Shape of output arrays must be %s' % (shape,))
+
+	result = []
+	for i, C in enumerate((X, Y)):
+		## Prepend missing batch dimensions
+		C = C[(np.newaxis,) * (len(shape) - C.ndim)]
+		C = _reduce_constant_axes(C)
+		## Output shape, keeping length 1 along constant axes
+		cshape = tuple(n if nc > 1 else 1 for n, nc in zip(shape, C.shape))
+		if out is not None and cshape == shape:
+			transform(C, out[i])
+			result.append(out[i])
+		else:
+			R = np.empty(cshape, dtype=dtype)
+			transform(C, R)
+			if out is not None:
+				out[i][...] = R
+				result.append(out[i])
+			else:
+				## Broadcast view for constant axes
+				result.append(np.broadcast_to(R, shape))
+
+	return tuple(result)
+
+
+def grid_center_to_edge_coordinates(Xc, Yc, out=None):
+	"""
+	Transform grid (or mesh) center coordinates to edge coordinates
+
+	:param Xc:
+		2D array (num_lats x num_lons), X center coordinates
+		or array (... x num_lats x num_lons) for stacks of grids
+		(leading batch dimensions are transformed in a single pass,
+		with the same result as transforming each grid separately)
+	:param Yc:
+		2D array (num_lats x num_lons), Y center coordinates
+		or array (... x num_lats x num_lons) for stacks of grids
+		Xc and Yc must be broadcastable to the same shape.
+		Rectilinear coordinates may be specified as broadcastable
+		arrays (e.g., shape (1 x num_lons) for X and (num_lats x 1)
+		for Y, as returned by np.meshgrid with sparse=True) or
+		as broadcast views, in which case they are transformed
+		with O(num_lats + num_lons) work and memory
+	:param out:
+		(Xe, Ye) tuple of arrays (... x num_lats+1 x num_lons+1),
+		arrays in which to store the result
+		(default: None, will allocate new arrays, which are
+		read-only broadcast views for rectilinear coordinates)
+
+	:return:
+		(Xe, Ye)
+		arrays (... x num_lats+1 x num_lons+1), X and Y edge coordinates,
+		with the same dtype as Xc and Yc if they are floating-point
+	"""
+	Xc, Yc = np.asarray(Xc), np.asarray(Yc)
+	assert Xc.ndim >= 2 and Yc.ndim >= 2
+	shape = np.broadcast(Xc, Yc).shape
+	shape = shape[:-2] + (shape[-2] + 1, shape[-1] + 1)
+
+	return _transform_coordinates(_center_to_edge, Xc, Yc, shape, out)
+
+
+def grid_edge_to_center_coordinates(Xe, Ye, out=None):
+	"""
+	Transform grid (or mesh) edge coordinates to center coordinates
+
+	:param Xe:
+		2D array (num_lats x num_lons), X edge coordinates
+		or array (... x num_lats x num_lons) for stacks of grids
+	:param Ye:
+		2D array (num_lats x num_lons), Y edge coordinates
+		or array (... x num_lats x num_lons) for stacks of grids
+		Batch dimensions and rectilinear coordinates are handled as
+		in :func:`grid_center_to_edge_coordinates`
+	:param out:
+		(Xc, Yc) tuple of arrays (... x num_lats-1 x num_lons-1),
+		arrays in which to store the result
+		(default: None, will allocate new arrays, which are
+		read-only broadcast views for rectilinear coordinates)
+
+	:return:
+		(Xc, Yc)
+		arrays (... x num_lats-1 x num_lons-1), X and Y center coordinates,
+		with the same dtype as Xe and Ye if they are floating-point
+	"""
+	Xe, Ye = np.asarray(Xe), np.asarray(Ye)
+	assert Xe.ndim >= 2 and Ye.ndim >= 2
+	shape = np.broadcast(Xe, Ye).shape
+	shape = shape[:-2] + (shape[-2] - 1, shape[-1] - 1)
+
+	return _transform_coordinates(_edge_to_center, Xe, Ye, shape, out)
@@ -0,0 +1,136 @@
+"""
+Decimation of dense (X, Y) datasets before plotting
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+import datetime
+
+import numpy as np
+
+
+__all__ = ['lttb_indices', 'minmax_buckets', 'is_sorted']
+
+
+def _as_float_array(x):
+	"""
+	Convert X values to float array suitable for decimation arithmetic.
+	Only relative distances matter, so the unit of datetimes is irrelevant
+
+	:param x:
+		1-D array or list, numbers, datetimes or numpy datetime64 values
+
+	:return:
+		1-D float array
+	"""
+	x = np.asarray(x)
+	if np.issubdtype(x.dtype, np.datetime64):
+		return x.astype('datetime64[us]').astype(np.int64).astype(np.float64)
+	elif x.dtype == object and len(x) and isinstance(x[0], datetime.datetime):
+		import matplotlib.dates as mpl_dates
+		return np.asarray(mpl_dates.date2num(x), dtype=np.float64)
+	else:
+		return x.astype(np.float64, copy=False)
+
+
+def is_sorted(x):
+	"""
+	Determine if X values are sorted in ascending order and free of
+	NaN values, as required by :func:`minmax_buckets`
+
+	:param x:
+		1-D array, X values (numbers or datetimes)
+
+	:return:
+		bool
+	"""
+	xf = _as_float_array(x)
+	return bool(len(xf) and np.isfinite(xf[0]) and np.isfinite(xf[-1])
+				and np.all(np.diff(xf) >= 0))
+
+
+def lttb_indices(x, y, num_points):
+	"""
+	Select points preserving the visual shape of a line using the
+	Largest-Triangle-Three-Buckets algorithm (Steinarsson, 2013).
+	The first and last points are always retained, and from each of
+	(num_points - 2) buckets of consecutive points, the point forming
+	the largest triangle with the previously selected point and the
+	average of the next bucket is retained.
+
+	:param x:
+		1-D array, X values (numbers or datetimes), sorted
+	:param y:
+		1-D array, Y values
+	:param num_points:
+		int, number of points to retain
+
+	:return:
+		1-D int array, indexes of retained points
+	"""
+	num_data = len(x)
+	if num_points >= num_data or num_points < 3:
+		return np.arange(num_data)
+
+	x = _as_float_array(x)
+	y = np.asarray(y, dtype=np.float64)
+
+	## Bucket boundaries, excluding first and last point
+	bucket_edges = np.linspace(1, num_data - 1, num_points - 1).astype(int)
+	bucket_starts, bucket_ends = bucket_edges[:-1], bucket_edges[1:]
+	bucket_lengths = bucket_ends - bucket_starts
+	bucket_x = np.add.reduceat(x[:-1], bucket_starts) / bucket_lengths
+	bucket_y = np.add.reduceat(y[:-1], bucket_starts) / bucket_lengths
+	## Average of next bucket, last point for the last bucket
+	next_x = np.append(bucket_x[1:], x[-1])
+	next_y = np.append(bucket_y[1:], y[-1])
+
+	idxs = np.empty(num_points, dtype=int)
+	idxs[0], idxs[-1] = 0, num_data - 1
+	a = 0
+	for b in range(num_points - 2):
+		start, end = bucket_starts[b], bucket_ends[b]
+		xa, ya = x[a], y[a]
+		## Twice the triangle area (sign is irrelevant)
+		areas = np.abs((xa - next_x[b]) * (y[start:end] - ya)
+						- (xa - x[start:end]) * (next_y[b] - ya))
+		a = start + np.argmax(areas)
+		idxs[b+1] = a
+
+	return idxs
+
+
+def minmax_buckets(x, y, num_buckets):
+	"""
+	Compute minimum and maximum Y value in buckets of equal X width
+	(typically one bucket per pixel column), ignoring NaN values
+
+	:param x:
+		1-D array, X values (numbers or datetimes), sorted
+	:param y:
+		1-D array, Y values
+	:param num_buckets:
+		int, number of buckets spanning the X range
+
+	:return:
+		(bucket_starts, ymin, ymax) tuple of 1-D arrays:
+		- bucket_starts: int array, index of first point in each
+		non-empty bucket
+		- ymin, ymax: float arrays, minimum and maximum Y value
+		in each non-empty bucket
+	"""
+	xf = _as_float_array(x)
+	y = np.asarray(y, dtype=np.float64)
+	if not is_sorted(xf):
+		raise ValueError('X values must be sorted and free of NaN values')
+
+	bucket_edges = np.linspace(xf[0], xf[-1], num_buckets + 1)
+	bucket_starts = np.searchsorted(xf, bucket_edges[:-1], side='left')
+	## Empty buckets share their start index with the next bucket
+	bucket_starts = np.unique(bucket_starts)
+
+	ymin = np.fmin.reduceat(y, bucket_starts)
+	ymax = np.fmax.reduceat(y, bucket_starts)
+
+	return (bucket_starts, ymin, ymax)
@@ -0,0 +1,1202 @@
+"""
+Accumulation of 2D point densities, independent of matplotlib
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+try:
+	## Python 2
+	basestring
+except:
+	## Python 3
+	basestring = str
+
+
+import datetime
+import itertools
+import mmap
+import sys
+
+import numpy as np
+
+
+__all__ = ['load_array', 'convert_dates', 'convert_date_limit',
+			'iter_xy_chunks', 'get_xy_extent', 'CellStatistic',
+			'DensityAccumulator', 'HexbinAccumulator', 'KDEAccumulator',
+			'DensityGrid', 'compute_density', 'accumulate_parallel']
+
+
+DEFAULT_CHUNK_SIZE = 2**20
+
+
+def load_array(array_or_filespec):
+	"""
+	Load array, memory-mapping .npy files
+
+	:param array_or_filespec:
+		array or str, full path to .npy file
+
+	:return:
+		array (memory-mapped if :param:`array_or_filespec` is a file)
+	"""
+	if isinstance(array_or_filespec, basestring):
+		return np.load(array_or_filespec, mmap_mode='r')
+	else:
+		return array_or_filespec
+
+
+def _as_float_chunk(values):
+	"""
+	Convert chunk of values to float array, numpy datetime64 values
+	are converted to matplotlib date numbers
+
+	:param values:
+		1-D array
+
+	:return:
+		1-D float array
+	"""
+	values = np.asarray(values)
+	if np.issubdtype(values.dtype, np.datetime64):
+		import matplotlib.dates as mpl_dates
+		return mpl_dates.date2num(values)
+	else:
+		return values.astype(np.float64, copy=False)
+
+
+def convert_dates(values, convert_objects=False):
+	"""
+	Convert datetimes to matplotlib date numbers. numpy datetime64
+	arrays are converted in a single vectorized operation, without
+	creating datetime objects
+
+	:param values:
+		1-D array or list, values or datetimes
+	:param convert_objects:
+		bool, whether or not to convert lists or arrays of datetime
+		objects as well (requires a conversion of each element)
+		(default: False)
+
+	:return:
+		(values, is_date) tuple:
+		- values: float array if :param:`values` are datetime64
+		(or datetime objects and :param:`convert_objects` is True),
+		else unchanged :param:`values`
+		- is_date: bool, whether or not :param:`values` are datetimes
+	"""
+	if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+		import matplotlib.dates as mpl_dates
+		return (mpl_dates.date2num(values), True)
+	elif len(values) and isinstance(values[0], datetime.datetime):
+		if convert_objects:
+			import matplotlib.dates as mpl_dates
+			values = mpl_dates.date2num(values)
+		return (values, True)
+	else:
+		return (values, False)
+
+
+def convert_date_limit(value):
+	"""
+	Convert axis limit to matplotlib date number if it is a datetime
+
+	:param value:
+		float, datetime, numpy datetime64 or None
+
+	:return:
+		float or None
+	"""
+	if isinstance(value, (datetime.datetime, np.datetime64)):
+		import matplotlib.dates as mpl_dates
+		return mpl_dates.date2num(value)
+	else:
+		return value
+
+
+def iter_xy_chunks(x, y=None, chunk_size=DEFAULT_CHUNK_SIZE, values=None):
+	"""
+	Iterate over X/Y data in chunks
+
+	:param x:
+		1-D array (possibly memory-mapped), str (full path to .npy file,
+		which will be memory-mapped) or, if :param:`y` is None,
+		iterable of (x_chunk, y_chunk) or (x_chunk, y_chunk, values_chunk)
+		tuples
+	:param y:
+		1-D array or str, Y data corresponding to :param:`x`
+		(default: None)
+	:param chunk_size:
+		int, number of points in each chunk, only applies if
+		:param:`x` and :param:`y` are arrays
+		(default: 2**20)
+	:param values:
+		1-D array or str, values corresponding to :param:`x`,
+		only applies if :param:`y` is not None
+		(default: None)
+
+	:return:
+		generator yielding (x_chunk, y_chunk) tuples of 1-D arrays,
+		or (x_chunk, y_chunk, values_chunk) tuples if data include values
+	"""
+	if y is None:
+		for chunk in x:
+			yield tuple(np.asarray(array) for array in chunk)
+	else:
+		arrays = [load_array(x), load_array(y)]
+		if values is not None:
+			arrays.append(load_array(values))
+		for array in arrays[1:]:
+			assert len(array) == len(arrays[0])
+		for i in range(0, len(arrays[0]), chunk_size):
+			yield tuple(np.asarray(array[i:i+chunk_size]) for array in arrays)
+
+
+def get_xy_extent(xy_chunks):
+	"""
+	Determine extent of X/Y data in a single pass over chunks,
+	ignoring NaN values
+
+	:param xy_chunks:
+		iterable of (x_chunk, y_chunk) tuples, additional elements
+		(values) are ignored
+
+	:return:
+		(xmin, xmax, ymin, ymax) tuple of floats
+	"""
+	xmin = ymin = np.inf
+	xmax = ymax = -np.inf
+	for chunk in xy_chunks:
+		x, y = chunk[:2]
+		is_valid = ~(np.isnan(x) | np.isnan(y))
+		if not is_valid.all():
+			x, y = x[is_valid], y[is_valid]
+		if len(x):
+			xmin, xmax = min(xmin, x.min()), max(xmax, x.max())
+			ymin, ymax = min(ymin, y.min()), max(ymax, y.max())
+
+	return (xmin, xmax, ymin, ymax)
+
+
+class CellStatistic(object):
+	"""
+	Streaming reduction of values grouped by (flattened) cell index,
+	using :func:`np.bincount` and unbuffered ufunc operations.
+	NaN values are ignored. All statistics except 'median' only keep
+	one or two arrays with the size of the grid; for the median, cell
+	indexes and values are kept until :meth:`get_values` is called
+
+	:param num_cells:
+		int, number of cells
+	:param statistic:
+		str, one of 'sum', 'mean', 'std', 'min', 'max' or 'median'
+		(default: 'mean')
+	"""
+	STATISTICS = ('sum', 'mean', 'std', 'min', 'max', 'median')
+
+	def __init__(self, num_cells, statistic='mean'):
+		if not statistic in self.STATISTICS:
+			raise ValueError('Unknown statistic: %s' % statistic)
+		self.num_cells = num_cells
+		self.statistic = statistic
+		self.counts = np.zeros(num_cells, dtype=np.int64)
+		if statistic in ('sum', 'mean', 'std'):
+			self.sums = np.zeros(num_cells)
+		if statistic == 'std':
+			self.sums2 = np.zeros(num_cells)
+		elif statistic == 'min':
+			self.mins = np.full(num_cells, np.inf)
+		elif statistic == 'max':
+			self.maxs = np.full(num_cells, -np.inf)
+		elif statistic == 'median':
+			self._idxs, self._values = [], []
+
+	def add(self, idxs, values):
+		"""
+		Add chunk of values
+
+		:param idxs:
+			1-D int array, cell index of each value
+		:param values:
+			1-D float array, values
+		"""
+		values = np.asarray(values, dtype=np.float64)
+		is_valid = ~np.isnan(values)
+		if not is_valid.all():
+			idxs, values = idxs[is_valid], values[is_valid]
+
+		self.counts += np.bincount(idxs, minlength=self.num_cells)
+		if self.statistic in ('sum', 'mean', 'std'):
+			self.sums += np.bincount(idxs, values, minlength=self.num_cells)
+		if self.statistic == 'std':
+			self.sums2 += np.bincount(idxs, values**2, minlength=self.num_cells)
+		elif self.statistic == 'min':
+			np.minimum.at(self.mins, idxs, values)
+		elif self.statistic == 'max':
+			np.maximum.at(self.maxs, idxs, values)
+		elif self.statistic == 'median':
+			self._idxs.append(idxs)
+			self._values.append(values)
+
+	def merge(self, other):
+		"""
+		Add values accumulated by another instance with the same cells
+
+		:param other:
+			instance of :class:`CellStatistic`
+		"""
+		self.counts += other.counts
+		if self.statistic in ('sum', 'mean', 'std'):
+			self.sums += other.sums
+		if self.statistic == 'std':
+			self.sums2 += other.sums2
+		elif self.statistic == 'min':
+			np.minimum(self.mins, other.mins, out=self.mins)
+		elif self.statistic == 'max':
+			np.maximum(self.maxs, other.maxs, out=self.maxs)
+		elif self.statistic == 'median':
+			self._idxs.extend(other._idxs)
+			self._values.extend(other._values)
+
+	def get_values(self):
+		"""
+		Compute statistic for each cell
+
+		:return:
+			1-D float array, NaN for cells without values
+		"""
+		is_empty = (self.counts == 0)
+		counts = np.maximum(self.counts, 1)
+		if self.statistic == 'sum':
+			result = self.sums.copy()
+		elif self.statistic == 'mean':
+			result = self.sums / counts
+		elif self.statistic == 'std':
+			## Population standard deviation
+			variance = self.sums2 / counts - (self.sums / counts)**2
+			result = np.sqrt(np.maximum(variance, 0))
+		elif self.statistic == 'min':
+			result = self.mins.copy()
+		elif self.statistic == 'max':
+			result = self.maxs.copy()
+		elif self.statistic == 'median':
+			idxs = np.concatenate(self._idxs + [np.array([], dtype=np.intp)])
+			values = np.concatenate(self._values + [np.array([])])
+			order = np.lexsort((values, idxs))
+			values = values[order]
+			## Values are sorted by cell, then by value
+			starts = np.cumsum(self.counts) - self.counts
+			lower = values[np.minimum(starts + (counts - 1) // 2, len(values) - 1)]
+			upper = values[np.minimum(starts + counts // 2, len(values) - 1)]
+			result = (lower + upper) / 2.
+		result[is_empty] = np.nan
+
+		return result
+
+
+class DensityAccumulator(object):
+	"""
+	Accumulate number of points per cell of a regular 2D grid with
+	fixed extent, one chunk of points at a time. Memory use only
+	depends on the grid size and the size of the chunks.
+	Binning is consistent with :func:`np.histogram2d`: cells include
+	their lower edge, and the last cell also includes its upper edge
+
+	:param grid_size:
+		int or (int, int) tuple, number of grid cells in X/Y direction
+	:param extent:
+		(xmin, xmax, ymin, ymax) tuple, grid extent
+	:param statistic:
+		str, statistic of values to compute in each cell in addition
+		to the point counts (see :class:`CellStatistic`)
+		(default: None)
+
+	:attr counts:
+		2D int array (num_x_cells x num_y_cells), point counts
+		(same orientation as :func:`np.histogram2d`)
+	:attr xedges:
+		1-D array, X coordinates of cell edges
+	:attr yedges:
+		1-D array, Y coordinates of cell edges
+	"""
+	def __init__(self, grid_size, extent, statistic=None):
+		if np.isscalar(grid_size):
+			grid_size = (grid_size, grid_size)
+		self.grid_size = tuple(int(n) for n in grid_size)
+		self.extent = tuple(float(val) for val in extent)
+		nx, ny = self.grid_size
+		xmin, xmax, ymin, ymax = self.extent
+		## Expand degenerate extent, like np.histogram2d
+		if xmin == xmax:
+			xmin, xmax = xmin - 0.5, xmax + 0.5
+		if ymin == ymax:
+			ymin, ymax = ymin - 0.5, ymax + 0.5
+		self.extent = (xmin, xmax, ymin, ymax)
+		self.xedges = np.linspace(xmin, xmax, nx + 1)
+		self.yedges = np.linspace(ymin, ymax, ny + 1)
+		self.counts = np.zeros(self.grid_size, dtype=np.int64)
+		self.statistic = statistic
+		if statistic:
+			self.cell_statistic = CellStatistic(self.counts.size, statistic)
+
+	def get_cell_indexes(self, x, y):
+		"""
+		Compute flattened cell indexes of points
+
+		:param x:
+			1-D array, X coordinates
+		:param y:
+			1-D array, Y coordinates
+
+		:return:
+			(idxs, is_inside) tuple:
+			- idxs: 1-D int array, flattened cell index for each point
+			inside the grid
+			- is_inside: 1-D bool array, whether or not each point is
+			inside the grid (False for NaN values)
+		"""
+		nx, ny = self.grid_size
+		xmin, xmax, ymin, ymax = self.extent
+		is_inside = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+		x, y = x[is_inside], y[is_inside]
+		ix = ((x - xmin) * (nx / (xmax - xmin))).astype(np.intp)
+		iy = ((y - ymin) * (ny / (ymax - ymin))).astype(np.intp)
+		## Upper edge belongs to last cell
+		np.minimum(ix, nx - 1, out=ix)
+		np.minimum(iy, ny - 1, out=iy)
+		## Correct rounding errors near cell edges
+		ix -= (x < self.xedges[ix])
+		ix += (x >= self.xedges[ix+1]) & (ix < nx - 1)
+		iy -= (y < self.yedges[iy])
+		iy += (y >= self.yedges[iy+1]) & (iy < ny - 1)
+
+		return (ix * ny + iy, is_inside)
+
+	def add(self, x, y, values=None):
+		"""
+		Add chunk of points
+
+		:param x:
+			1-D array, X coordinates
+		:param y:
+			1-D array, Y coordinates
+		:param values:
+			1-D array, values of points, required if :attr:`statistic`
+			is set
+			(default: None)
+		"""
+		idxs, is_inside = self.get_cell_indexes(np.asarray(x), np.asarray(y))
+		self.counts += np.bincount(idxs, minlength=self.counts.size).reshape(
+																self.grid_size)
+		if self.statistic:
+			self.cell_statistic.add(idxs, np.asarray(values)[is_inside])
+
+	def add_chunks(self, xy_chunks):
+		"""
+		Add all chunks from an iterable
+
+		:param xy_chunks:
+			iterable of (x_chunk, y_chunk) or (x_chunk, y_chunk, values_chunk)
+			tuples
+		"""
+		for chunk in xy_chunks:
+			self.add(*chunk)
+
+	def merge(self, other):
+		"""
+		Add counts accumulated by another instance with the same grid
+
+		:param other:
+			instance of :class:`DensityAccumulator`
+		"""
+		self.counts += other.counts
+		if self.statistic:
+			self.cell_statistic.merge(other.cell_statistic)
+
+	def get_values(self):
+		"""
+		Get statistic of values in each cell
+
+		:return:
+			2D float array (num_x_cells x num_y_cells),
+			NaN for cells without values
+		"""
+		return self.cell_statistic.get_values().reshape(self.grid_size)
+
+
+class HexbinAccumulator(object):
+	"""
+	Accumulate number of points per hexagon, one chunk of points at a
+	time. The hexagonal grid and the binning are identical to
+	:meth:`matplotlib.axes.Axes.hexbin` with the same extent
+
+	:param grid_size:
+		int or (int, int) tuple, number of hexagons in X direction or
+		in X/Y direction. If int, the number of hexagons in Y direction
+		is chosen such that hexagons are approximately regular
+	:param extent:
+		(xmin, xmax, ymin, ymax) tuple, grid extent
+	:param statistic:
+		str, statistic of values to compute in each hexagon in addition
+		to the point counts (see :class:`CellStatistic`)
+		(default: None)
+
+	:attr counts:
+		1-D int array, point counts for the hexagons of both lattices
+		(same order as the offsets of :meth:`get_offsets`)
+	"""
+	def __init__(self, grid_size, extent, statistic=None):
+		if np.isscalar(grid_size):
+			nx = int(grid_size)
+			ny = int(nx / np.sqrt(3))
+		else:
+			nx, ny = [int(n) for n in grid_size]
+		self.grid_size = (nx, ny)
+		xmin, xmax, ymin, ymax = [float(val) for val in extent]
+		## Padding to avoid roundoff errors, like matplotlib
+		padding = 1.e-9 * (xmax - xmin)
+		self.extent = (xmin - padding, xmax + padding, ymin, ymax)
+		self.sx = (self.extent[1] - self.extent[0]) / nx
+		self.sy = (ymax - ymin) / ny
+		self.counts = np.zeros((nx + 1) * (ny + 1) + nx * ny, dtype=np.int64)
+		self.statistic = statistic
+		if statistic:
+			self.cell_statistic = CellStatistic(len(self.counts), statistic)
+
+	def get_cell_indexes(self, x, y):
+		"""
+		Compute hexagon indexes of points
+
+		:param x:
+			1-D array, X coordinates
+		:param y:
+			1-D array, Y coordinates
+
+		:return:
+			(idxs, is_inside) tuple:
+			- idxs: 1-D int array, hexagon index for each point
+			inside the grid
+			- is_inside: 1-D bool array, whether or not each point is
+			inside the grid (False for NaN values)
+		"""
+		nx, ny = self.grid_size
+		nx1, ny1 = nx + 1, ny + 1
+		ix = (np.asarray(x, dtype=np.float64) - self.extent[0]) / self.sx
+		iy = (np.asarray(y, dtype=np.float64) - self.extent[2]) / self.sy
+		## NaN values are out of range
+		ix1, iy1 = np.round(ix), np.round(iy)
+		ix2, iy2 = np.floor(ix), np.floor(iy)
+		d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+		d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+		bdist = (d1 < d2)
+
+		## Lattice 1 (hexagon centers on grid nodes), followed by
+		## lattice 2 (hexagon centers on cell centers)
+		is_inside1 = bdist & (ix1 >= 0) & (ix1 < nx1) & (iy1 >= 0) & (iy1 < ny1)
+		is_inside2 = ~bdist & (ix2 >= 0) & (ix2 < nx) & (iy2 >= 0) & (iy2 < ny)
+		is_inside = is_inside1 | is_inside2
+		idxs = np.where(bdist, ix1 * ny1 + iy1, nx1 * ny1 + ix2 * ny + iy2)
+		idxs = idxs[is_inside].astype(np.intp)
+
+		return (idxs, is_inside)
+
+	def add(self, x, y, values=None):
+		"""
+		Add chunk of points
+
+		:param x:
+			1-D array, X coordinates
+		:param y:
+			1-D array, Y coordinates
+		:param values:
+			1-D array, values of points, required if :attr:`statistic`
+			is set
+			(default: None)
+		"""
+		idxs, is_inside = self.get_cell_indexes(x, y)
+		self.counts += np.bincount(idxs, minlength=len(self.counts))
+		if self.statistic:
+			self.cell_statistic.add(idxs, np.asarray(values)[is_inside])
+
+	def add_chunks(self, xy_chunks):
+		"""
+		Add all chunks from an iterable
+
+		:param xy_chunks:
+			iterable of (x_chunk, y_chunk) or (x_chunk, y_chunk, values_chunk)
+			tuples
+		"""
+		for chunk in xy_chunks:
+			self.add(*chunk)
+
+	def merge(self, other):
+		"""
+		Add counts accumulated by another instance with the same grid
+
+		:param other:
+			instance of :class:`HexbinAccumulator`
+		"""
+		self.counts += other.counts
+		if self.statistic:
+			self.cell_statistic.merge(other.cell_statistic)
+
+	def get_values(self):
+		"""
+		Get statistic of values in each hexagon
+
+		:return:
+			1-D float array, NaN for hexagons without values
+		"""
+		return self.cell_statistic.get_values()
+
+	def get_offsets(self):
+		"""
+		Compute coordinates of hexagon centers
+
+		:return:
+			2D float array (num_hexagons x 2)
+		"""
+		nx, ny = self.grid_size
+		nx1, ny1 = nx + 1, ny + 1
+		offsets = np.zeros((len(self.counts), 2))
+		offsets[:nx1*ny1, 0] = np.repeat(np.arange(nx1), ny1)
+		offsets[:nx1*ny1, 1] = np.tile(np.arange(ny1), nx1)
+		offsets[nx1*ny1:, 0] = np.repeat(np.arange(nx) + 0.5, ny)
+		offsets[nx1*ny1:, 1] = np.tile(np.arange(ny), nx) + 0.5
+		offsets[:,0] = offsets[:,0] * self.sx + self.extent[0]
+		offsets[:,1] = offsets[:,1] * self.sy + self.extent[2]
+
+		return offsets
+
+
+class KDEAccumulator(object):
+	"""
+	Binned kernel density estimate on the nodes of a regular 2D grid,
+	accumulated one chunk of points at a time.
+	Points are distributed over the 4 surrounding grid nodes by linear
+	binning, and the binned counts are convolved with a Gaussian kernel
+	using FFT, which costs O(N + M log M) instead of the O(N * M) of
+	evaluating :class:`scipy.stats.gaussian_kde` at each of M nodes.
+	The kernel covariance is derived from the data covariance in the
+	same way as :class:`scipy.stats.gaussian_kde`.
+	To capture points outside the extent, the binning grid is padded
+	with half the number of nodes on each side; the kernel is truncated
+	at 4 standard deviations or at the padding
+
+	:param grid_size:
+		int or (int, int) tuple, number of grid nodes in X/Y direction
+	:param extent:
+		(xmin, xmax, ymin, ymax) tuple, coordinates of outer grid nodes
+
+	:attr xnodes:
+		1-D array, X coordinates of grid nodes
+	:attr ynodes:
+		1-D array, Y coordinates of grid nodes
+	:attr num_points:
+		int, number of points accumulated so far
+	"""
+	def __init__(self, grid_size, extent):
+		if np.isscalar(grid_size):
+			grid_size = (grid_size, grid_size)
+		self.grid_size = tuple(int(n) for n in grid_size)
+		xmin, xmax, ymin, ymax = [float(val) for val in extent]
+		if xmin == xmax:
+			xmin, xmax = xmin - 0.5, xmax + 0.5
+		if ymin == ymax:
+			ymin, ymax = ymin - 0.5, ymax + 0.5
+		self.extent = (xmin, xmax, ymin, ymax)
+		nx, ny = self.grid_size
+		self.xnodes = np.linspace(xmin, xmax, nx)
+		self.ynodes = np.linspace(ymin, ymax, ny)
+		self.dx = (xmax - xmin) / (nx - 1)
+		self.dy = (ymax - ymin) / (ny - 1)
+		self.padding = (nx // 2, ny // 2)
+		px, py = self.padding
+		self.binned = np.zeros((nx + 2 * px, ny + 2 * py))
+
+		## Moments relative to grid center, for the data covariance
+		self._center = ((xmin + xmax) / 2., (ymin + ymax) / 2.)
+		self.num_points = 0
+		self._sums = np.zeros(5)
+
+	def add(self, x, y):
+		"""
+		Add chunk of points
+
+		:param x:
+			1-D array, X coordinates
+		:param y:
+			1-D array, Y coordinates
+		"""
+		x = np.asarray(x, dtype=np.float64)
+		y = np.asarray(y, dtype=np.float64)
+		is_valid = ~(np.isnan(x) | np.isnan(y))
+		if not is_valid.all():
+			x, y = x[is_valid], y[is_valid]
+
+		xc, yc = x - self._center[0], y - self._center[1]
+		self.num_points += len(x)
+		self._sums += [xc.sum(), yc.sum(), np.dot(xc, xc), np.dot(yc, yc),
+						np.dot(xc, yc)]
+
+		## Fractional node indexes in padded grid
+		mx, my = self.binned.shape
+		px, py = self.padding
+		fx = (x - self.extent[0]) / self.dx + px
+		fy = (y - self.extent[2]) / self.dy + py
+		is_inside = (fx >= 0) & (fx <= mx - 1) & (fy >= 0) & (fy <= my - 1)
+		fx, fy = fx[is_inside], fy[is_inside]
+		ix = np.minimum(fx.astype(np.intp), mx - 2)
+		iy = np.minimum(fy.astype(np.intp), my - 2)
+		wx, wy = fx - ix, fy - iy
+
+		idxs = ix * my + iy
+		size = self.binned.size
+		binned = self.binned.reshape(-1)
+		binned += np.bincount(idxs, (1 - wx) * (1 - wy), minlength=size)
+		binned += np.bincount(idxs + my, wx * (1 - wy), minlength=size)
+		binned += np.bincount(idxs + 1, (1 - wx) * wy, minlength=size)
+		binned += np.bincount(idxs + my + 1, wx * wy, minlength=size)
+
+	def add_chunks(self, xy_chunks):
+		"""
+		Add all chunks from an iterable
+
+		:param xy_chunks:
+			iterable of (x_chunk, y_chunk) tuples
+		"""
+		for (x, y) in xy_chunks:
+			self.add(x, y)
+
+	def merge(self, other):
+		"""
+		Add points accumulated by another instance with the same grid
+
+		:param other:
+			instance of :class:`KDEAccumulator`
+		"""
+		self.binned += other.binned
+		self.num_points += other.num_points
+		self._sums += other._sums
+
+	def get_data_covariance(self):
+		"""
+		Compute covariance matrix of accumulated points
+
+		:return:
+			2x2 float array
+		"""
+		n = self.num_points
+		sx, sy, sxx, syy, sxy = self._sums
+		cov = np.array([[sxx - sx * sx / n, sxy - sx * sy / n],
+						[sxy - sx * sy / n, syy - sy * sy / n]])
+		return cov / (n - 1)
+
+	def get_covariance_factor(self, bw_method='scott'):
+		"""
+		Compute bandwidth factor, as in :class:`scipy.stats.gaussian_kde`
+
+		:param bw_method:
+			str ('scott' or 'silverman') or float, bandwidth method
+			(default: 'scott')
+
+		:return:
+			float
+		"""
+		n, d = self.num_points, 2
+		if bw_method == 'scott':
+			return n ** (-1. / (d + 4))
+		elif bw_method == 'silverman':
+			return (n * (d + 2) / 4.) ** (-1. / (d + 4))
+		elif np.isscalar(bw_method) and not isinstance(bw_method, basestring):
+			return float(bw_method)
+		else:
+			raise ValueError('Unknown bandwidth method: %s' % bw_method)
+
+	def get_density(self, bw_method='scott'):
+		"""
+		Compute kernel density at grid nodes, scaled such that it
+		sums to the number of points
+
+		:param bw_method:
+			str ('scott' or 'silverman') or float, bandwidth method
+			(default: 'scott')
+
+		:return:
+			2D float array (num_x_nodes x num_y_nodes)
+		"""
+		from scipy.signal import fftconvolve
+
+		if self.num_points < 2:
+			raise ValueError('KDE requires at least 2 data points')
+
+		factor = self.get_covariance_factor(bw_method)
+		cov = self.get_data_covariance() * factor**2
+		inv_cov = np.linalg.inv(cov)
+
+		## Kernel on grid offsets, truncated at 4 standard deviations
+		px, py = self.padding
+		kx = min(px, int(np.ceil(4 * np.sqrt(cov[0,0]) / self.dx)))
+		ky = min(py, int(np.ceil(4 * np.sqrt(cov[1,1]) / self.dy)))
+		ox = np.arange(-kx, kx + 1) * self.dx
+		oy = np.arange(-ky, ky + 1) * self.dy
+		ox, oy = ox[:,np.newaxis], oy[np.newaxis,:]
+		kernel = np.exp(-0.5 * (inv_cov[0,0] * ox**2 + 2 * inv_cov[0,1] * ox * oy
+								+ inv_cov[1,1] * oy**2))
+
+		## Only padding within kernel reach affects the grid
+		binned = self.binned[px-kx:self.binned.shape[0]-px+kx,
+							py-ky:self.binned.shape[1]-py+ky]
+		density = fftconvolve(binned, kernel, mode='valid')
+		## FFT round-off may produce tiny negative values
+		np.maximum(density, 0, out=density)
+
+		## Un-normalize density
+		total = density.sum()
+		if total > 0:
+			density *= (self.num_points / total)
+
+		return density
+
+
+class DensityGrid(object):
+	"""
+	Result of a density computation, containing everything needed to
+	plot it, but not the data points themselves
+
+	:param density_type:
+		str, type of density: 'hist2d', 'hexbin' or 'kde'
+	:param extent:
+		(xmin, xmax, ymin, ymax) tuple, extent used for the computation
+	:param grid_size:
+		(int, int) tuple, number of grid cells (or hexagons, or KDE
+		nodes) in X/Y direction
+	:param counts:
+		array, number of points per grid cell ('hist2d': 2D array,
+		'hexbin': 1-D array), None for 'kde'
+		(default: None)
+	:param values:
+		array with same shape as :param:`counts`, statistic of values
+		per grid cell, or 2D array with densities at the nodes for 'kde'
+		(default: None)
+	:param xedges:
+		1-D array, X coordinates of cell edges ('hist2d'), or of edges
+		of the cells centered on the nodes ('kde')
+		(default: None)
+	:param yedges:
+		1-D array, Y coordinates of cell edges
+		(default: None)
+	:param offsets:
+		2D array (num_hexagons x 2), coordinates of hexagon centers
+		('hexbin' only)
+		(default: None)
+	:param statistic:
+		str, name of statistic in :param:`values` if it contains
+		aggregated values
+		(default: None)
+	:param x_is_date:
+		bool, whether or not X coordinates are matplotlib date numbers
+		(default: False)
+	:param y_is_date:
+		bool, whether or not Y coordinates are matplotlib date numbers
+		(default: False)
+	"""
+	## Array attributes that may be None
+	_ARRAYS = ['counts', 'values', 'xedges', 'yedges', 'offsets']
+
+	def __init__(self, density_type, extent, grid_size, counts=None,
+				values=None, xedges=None, yedges=None, offsets=None,
+				statistic=None, x_is_date=False, y_is_date=False):
+		self.density_type = density_type
+		self.extent = tuple(float(val) for val in extent)
+		self.grid_size = tuple(int(n) for n in grid_size)
+		self.counts = counts
+		self.values = values
+		self.xedges = xedges
+		self.yedges = yedges
+		self.offsets = offsets
+		self.statistic = statistic
+		self.x_is_date = bool(x_is_date)
+		self.y_is_date = bool(y_is_date)
+
+	def __repr__(self):
+		return '<DensityGrid %s %dx%d>' % ((self.density_type,) + self.grid_size)
+
+	def save(self, npz_filespec):
+		"""
+		Save to (compressed) .npz file
+
+		:param npz_filespec:
+			str, full path to .npz file
+		"""
+		arrays = {key: getattr(self, key) for key in self._ARRAYS
+				if getattr(self, key) is not None}
+		np.savez_compressed(npz_filespec, density_type=self.density_type,
+							extent=self.extent, grid_size=self.grid_size,
+							statistic=self.statistic or '',
+							is_date=[self.x_is_date, self.y_is_date], **arrays)
+
+	@classmethod
+	def load(cls, npz_filespec):
+		"""
+		Load from .npz file written by :meth:`save`
+
+		:param npz_filespec:
+			str, full path to .npz file
+
+		:return:
+			instance of :class:`DensityGrid`
+		"""
+		with np.load(npz_filespec, allow_pickle=False) as npz:
+			arrays = {key: npz[key] for key in cls._ARRAYS if key in npz}
+			x_is_date, y_is_date = npz['is_date']
+			return cls('%s' % npz['density_type'], npz['extent'], npz['grid_size'],
+						statistic=('%s' % npz['statistic']) or None,
+						x_is_date=x_is_date, y_is_date=y_is_date, **arrays)
+
+
+def compute_density(x, y, grid_size, density_type='hist2d', values=None,
+					statistic='mean', xmin=None, xmax=None, ymin=None, ymax=None,
+					chunk_size=None, workers=None, bw_method='scott'):
+	"""
+	Compute density of XY data (number of data points per grid cell),
+	or statistic of a third variable per grid cell, without plotting it.
+	The result can be plotted (repeatedly) with :func:`generic_mpl.plot_density`,
+	and saved to / loaded from a .npz file
+
+	:param x:
+		1-D array, X data (values, datetimes or numpy datetime64),
+		may be memory-mapped
+		or str, full path to .npy file (will be memory-mapped)
+		or, if :param:`y` is None, iterable of (x_chunk, y_chunk) tuples
+		(requires :param:`xmin`, :param:`xmax`, :param:`ymin` and
+		:param:`ymax`)
+	:param y:
+		1-D array or str, Y data corresponding to :param:`x`
+	:param grid_size:
+		int or (int, int) tuple, the number of grid cells in the X/Y
+		direction
+	:param density_type:
+		str, type of density: 'hist2d', 'hexbin' or 'kde'
+		(default: 'hist2d')
+	:param values:
+		1-D array or str (full path to .npy file), values corresponding
+		to :param:`x` to aggregate in each grid cell, in addition to
+		counting data points (not for :param:`density_type` 'kde').
+		If data are given as chunks, values should be included as third
+		element in each chunk instead
+		(default: None)
+	:param statistic:
+		str, statistic of :param:`values`: 'sum', 'mean', 'std',
+		'min', 'max' or 'median'.
+		Note that for 'median', all values are kept in memory
+		(default: 'mean')
+	:param xmin:
+		float, datetime or numpy datetime64, start of grid in X direction
+		(default: None, will use minimum of data)
+	:param xmax:
+		float, datetime or numpy datetime64, end of grid in X direction
+		(default: None, will use maximum of data)
+	:param ymin:
+		float, datetime or numpy datetime64, start of grid in Y direction
+		(default: None, will use minimum of data)
+	:param ymax:
+		float, datetime or numpy datetime64, end of grid in Y direction
+		(default: None, will use maximum of data)
+	:param chunk_size:
+		int, number of data points to bin at a time. If specified,
+		or if data are memory-mapped or given as chunks, counts are
+		accumulated chunk by chunk, so that memory use does not depend
+		on the number of data points
+		(default: None)
+	:param workers:
+		int, number of worker processes binning the data in parallel
+		(in shared memory), only if :param:`y` is not None.
+		Data are only binned in parallel if :param:`workers` is larger
+		than 1, 0 means the number of CPUs
+		(default: None, no worker processes)
+	:param bw_method:
+		str ('scott' or 'silverman') or float, method to determine
+		kernel bandwidth for :param:`density_type` 'kde', see
+		:class:`scipy.stats.gaussian_kde`
+		(default: 'scott')
+
+	:return:
+		instance of :class:`DensityGrid`
+	"""
+	if isinstance(grid_size, int):
+		grid_size = (grid_size, grid_size)
+
+	xmin, xmax, ymin, ymax = [convert_date_limit(val)
+							for val in (xmin, xmax, ymin, ymax)]
+
+	## Data chunks are only read when binning, datetimes are converted
+	## chunk by chunk
+	is_chunked = (y is None or chunk_size is not None
+				or isinstance(x, (basestring, np.memmap)))
+	## Parallel workers read (memory-mapped or shared) arrays directly
+	use_workers = (workers is not None and workers != 1 and y is not None)
+	if y is None:
+		## Peek at first chunk to see if it includes values
+		x = iter(x)
+		first_chunk = next(x, ())
+		x = itertools.chain([first_chunk], x) if len(first_chunk) else x
+		has_values = len(first_chunk) > 2
+	else:
+		has_values = values is not None
+	if has_values and density_type == 'kde':
+		raise ValueError('Values are not supported for density_type kde')
+	if is_chunked:
+		is_date = [False, False]
+		def get_xy_chunks():
+			for chunk in iter_xy_chunks(x, y, chunk_size or DEFAULT_CHUNK_SIZE,
+										values=values):
+				x_chunk, is_date[0] = convert_dates(chunk[0], convert_objects=True)
+				y_chunk, is_date[1] = convert_dates(chunk[1], convert_objects=True)
+				yield (x_chunk, y_chunk) + tuple(chunk[2:])
+		if use_workers:
+			is_date = [np.issubdtype(np.asarray(load_array(val)).dtype, np.datetime64)
+						for val in (x, y)]
+	else:
+		x, x_is_date = convert_dates(x, convert_objects=True)
+		y, y_is_date = convert_dates(y, convert_objects=True)
+		x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+		if has_values:
+			values = np.asarray(load_array(values), dtype=np.float64)
+			get_xy_chunks = lambda: [(x, y, values)]
+		else:
+			get_xy_chunks = lambda: [(x, y)]
+
+	if None in (xmin, xmax, ymin, ymax):
+		if y is None:
+			raise ValueError('Extent (xmin, xmax, ymin, ymax) must be specified '
+							'if data are given as chunks')
+		data_extent = get_xy_extent(get_xy_chunks())
+	_xmin = xmin if xmin is not None else data_extent[0]
+	_xmax = xmax if xmax is not None else data_extent[1]
+	_ymin = ymin if ymin is not None else data_extent[2]
+	_ymax = ymax if ymax is not None else data_extent[3]
+	extent = (_xmin, _xmax, _ymin, _ymax)
+
+	## Bin into preallocated grid, without copying the data
+	cell_statistic = statistic if has_values else None
+	if density_type == 'hist2d':
+		accumulator = DensityAccumulator(grid_size, extent, statistic=cell_statistic)
+	elif density_type == 'hexbin':
+		accumulator = HexbinAccumulator(grid_size, extent, statistic=cell_statistic)
+	elif density_type == 'kde':
+		accumulator = KDEAccumulator(grid_size, extent)
+	else:
+		raise ValueError('Unknown density_type: %s' % density_type)
+	if use_workers:
+		accumulate_parallel(accumulator, x, y, values=values, workers=workers,
+							chunk_size=chunk_size or DEFAULT_CHUNK_SIZE)
+	else:
+		accumulator.add_chunks(get_xy_chunks())
+
+	if is_chunked:
+		x_is_date, y_is_date = is_date
+
+	grid_args = dict(statistic=cell_statistic, x_is_date=x_is_date,
+					y_is_date=y_is_date)
+	if density_type == 'hist2d':
+		return DensityGrid('hist2d', extent, accumulator.grid_size,
+							counts=accumulator.counts,
+							values=accumulator.get_values() if has_values else None,
+							xedges=accumulator.xedges, yedges=accumulator.yedges,
+							**grid_args)
+	elif density_type == 'hexbin':
+		return DensityGrid('hexbin', extent, accumulator.grid_size,
+							counts=accumulator.counts,
+							values=accumulator.get_values() if has_values else None,
+							offsets=accumulator.get_offsets(), **grid_args)
+	elif density_type == 'kde':
+		## Edges of cells centered on the KDE nodes
+		nx, ny = accumulator.grid_size
+		xnodes, ynodes = accumulator.xnodes, accumulator.ynodes
+		dx, dy = accumulator.dx / 2., accumulator.dy / 2.
+		xedges = np.linspace(xnodes[0] - dx, xnodes[-1] + dx, nx + 1)
+		yedges = np.linspace(ynodes[0] - dy, ynodes[-1] + dy, ny + 1)
+		return DensityGrid('kde', extent, accumulator.grid_size,
+							values=accumulator.get_density(bw_method=bw_method),
+							xedges=xedges, yedges=yedges, **grid_args)
+
+
+def _share_array(array):
+	"""
+	Make array accessible to worker processes without pickling it.
+	Memory-mapped files are reopened by the workers, other arrays are
+	copied to a shared memory block
+
+	:param array:
+		1-D array or str (full path to .npy file)
+
+	:return:
+		(shm, spec) tuple:
+		- shm: instance of :class:`multiprocessing.shared_memory.SharedMemory`
+		or None
+		- spec: tuple, specification for :func:`_attach_array`
+	"""
+	if isinstance(array, basestring):
+		return (None, ('npy', array))
+	elif isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap):
+		return (None, ('memmap', array.filename, array.dtype.str, array.shape,
+						array.offset))
+	else:
+		from multiprocessing import shared_memory
+
+		array = np.asarray(array)
+		shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+		shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+		shared_array[:] = array
+		return (shm, ('shm', shm.name, array.dtype.str, array.shape))
+
+
+def _attach_array(spec):
+	"""
+	Access array shared by :func:`_share_array`
+
+	:param spec:
+		tuple, array specification
+
+	:return:
+		(shm, array) tuple
+	"""
+	if spec[0] == 'npy':
+		return (None, np.load(spec[1], mmap_mode='r'))
+	elif spec[0] == 'memmap':
+		_, filename, dtype, shape, offset = spec
+		return (None, np.memmap(filename, dtype=dtype, mode='r', shape=shape,
+								offset=offset))
+	else:
+		from multiprocessing import shared_memory
+
+		_, name, dtype, shape = spec
+		## The segment is owned (and unlinked) by the parent process,
+		## so it should not be registered with the resource tracker again
+		if sys.version_info >= (3, 13):
+			shm = shared_memory.SharedMemory(name=name, track=False)
+		else:
+			## Before Python 3.13, attaching always registers the segment.
+			## Unregistering afterwards is not an option, as the workers
+			## share the resource tracker of the parent process, which
+			## would then fail to unregister the segment on unlink
+			from multiprocessing import resource_tracker
+
+			register = resource_tracker.register
+			resource_tracker.register = lambda name, rtype: None
+			try:
+				shm = shared_memory.SharedMemory(name=name)
+			finally:
+				resource_tracker.register = register
+		return (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _accumulate_shard(accumulator, array_specs, start, stop, chunk_size):
+	"""
+	Worker function: accumulate slice of shared X/Y data
+
+	:param accumulator:
+		empty accumulator instance
+	:param array_specs:
+		list of tuples, X, Y and (optionally) values array specifications
+	:param start:
+		int, index of first point in shard
+	:param stop:
+		int, index of last point in shard + 1
+	:param chunk_size:
+		int, number of points to bin at a time
+
+	:return:
+		accumulator instance
+	"""
+	shms, arrays = zip(*[_attach_array(spec) for spec in array_specs])
+	try:
+		for i in range(start, stop, chunk_size):
+			j = min(i + chunk_size, stop)
+			accumulator.add(*[_as_float_chunk(array[i:j]) for array in arrays])
+	finally:
+		## Release views on shared memory before closing it
+		del arrays
+		for shm in shms:
+			if shm is not None:
+				shm.close()
+
+	return accumulator
+
+
+def accumulate_parallel(accumulator, x, y, values=None, workers=None,
+						chunk_size=DEFAULT_CHUNK_SIZE):
+	"""
+	Accumulate X/Y data in parallel: the data are split in shards, each
+	shard is accumulated by a worker process into an empty copy of
+	:param:`accumulator`, and the partial results are merged.
+	The data are not pickled: memory-mapped files are reopened by the
+	workers, and in-memory arrays are passed through shared memory.
+	Worker processes are only used if :param:`workers` is larger
+	than 1, otherwise the data are accumulated in the current process
+
+	:param accumulator:
+		empty instance of :class:`DensityAccumulator`,
+		:class:`HexbinAccumulator` or :class:`KDEAccumulator`,
+		will be updated in place
+	:param x:
+		1-D array (possibly memory-mapped) or str (full path to .npy file),
+		X data (values or numpy datetime64)
+	:param y:
+		1-D array or str, Y data corresponding to :param:`x`
+	:param values:
+		1-D array or str, values corresponding to :param:`x`,
+		required if accumulator has a statistic
+		(default: None)
+	:param workers:
+		int, number of worker processes, 0 means number of CPUs
+		(default: None, no worker processes)
+	:param chunk_size:
+		int, number of points each worker bins at a time
+		(default: 2**20)
+
+	:return:
+		accumulator
+	"""
+	import os
+	from concurrent.futures import ProcessPoolExecutor
+
+	arrays = [x, y] if values is None else [x, y, values]
+	num_points = len(load_array(x))
+	for array in arrays[1:]:
+		assert len(load_array(array)) == num_points
+	if workers == 0:
+		workers = os.cpu_count() or 1
+
+	if workers is None or workers <= 1:
+		arrays = [load_array(array) for array in arrays]
+		for i in range(0, num_points, chunk_size):
+			j = i + chunk_size
+			accumulator.add(*[_as_float_chunk(array[i:j]) for array in arrays])
+		return accumulator
+
+	shard_edges = np.linspace(0, num_points, workers + 1).astype(int)
+
+	shms, array_specs = [], []
+	try:
+		for array in arrays:
+			shm, spec = _share_array(array)
+			shms.append(shm)
+			array_specs.append(spec)
+
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			futures = [executor.submit(_accumulate_shard, accumulator, array_specs,
+									start, stop, chunk_size)
+						for (start, stop) in zip(shard_edges[:-1], shard_edges[1:])
+						if stop > start]
+			partial_accumulators = [future.result() for future in futures]
+	finally:
+		for shm in shms:
+			if shm is not None:
+				shm.close()
+				shm.unlink()
+
+	for partial_accumulator in partial_accumulators:
+		accumulator.merge(partial_accumulator)
+
+	return accumulator
@@ -13,8 +13,8 @@ except:
 	basestring = str
 
 
-import pylab
 import matplotlib
+import matplotlib.artist
 import matplotlib.ticker
 import matplotlib.dates as mpl_dates
 
@@ -432,14 +432,14 @@ def plot_ax_frame(ax, x_is_date=False, y_is_date=False,
 		ax.set_yticklabels(ytick_labels)
 
 	## Tick label size and rotation
-	pylab.setp(ax.get_xticklabels(), fontsize=tick_label_fontsize)
-	pylab.setp(ax.get_yticklabels(), fontsize=tick_label_fontsize)
+	matplotlib.artist.setp(ax.get_xticklabels(), fontsize=tick_label_fontsize)
+	matplotlib.artist.setp(ax.get_yticklabels(), fontsize=tick_label_fontsize)
 
 	if xtick_rotation:
-		pylab.setp(ax.get_xticklabels(), ha='right', rotation=xtick_rotation)
+		matplotlib.artist.setp(ax.get_xticklabels(), ha='right', rotation=xtick_rotation)
 
 	if ytick_rotation:
-		pylab.setp(ax.get_yticklabels(), ha='right', rotation=ytick_rotation)
+		matplotlib.artist.setp(ax.get_yticklabels(), ha='right', rotation=ytick_rotation)
 
 	## Tick aspect
 	if tick_params:
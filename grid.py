@@ -13,89 +13,529 @@ except:
 
 
 import numpy as np
-import pylab
 import matplotlib
 
 
-from .common import (show_or_save_plot, common_doc)
+from .common import (show_or_save_plot, common_doc, headless_aware,
+					create_fig_and_ax, shared_style_context, get_ax_pixel_size)
 from .frame import (plot_ax_frame, ax_frame_doc)
+from .coords import (grid_center_to_edge_coordinates,
+					grid_edge_to_center_coordinates)
+from .pyramid import (block_reduce, get_pyramid_level, select_pyramid_level)
+from .density import load_array
+from .stats import GridStats
+from .contours import (compute_contours, ContourPaths)
+from .labels import LabelCuller
+from .layout import (get_colorbar_layout, PARENT_ANCHORS)
 
 
-__all__ = ['plot_grid', 'grid_center_to_edge_coordinates',
+__all__ = ['plot_grid', 'GridPlot', 'grid_center_to_edge_coordinates',
 			'grid_edge_to_center_coordinates']
 
 
-def grid_center_to_edge_coordinates(Xc, Yc):
+def _is_uniform(values, rtol=1E-5):
 	"""
-	Transform grid (or mesh) center coordinates to edge coordinates
+	Determine if values are uniformly spaced
 
+	:param values:
+		1-D array
+
+	:return:
+		bool
+	"""
+	if len(values) < 2:
+		return False
+	diffs = np.diff(values)
+	return diffs[0] != 0 and np.allclose(diffs, diffs[0], rtol=rtol, atol=0)
+
+
+def _get_regular_edges(data_shape, X, Y):
+	"""
+	Determine if X/Y coordinates define a regular rectilinear grid
+	(uniform spacing along each axis), without constructing meshes
+
+	:param data_shape:
+		(num_rows, num_cols) tuple, shape of data
+	:param X:
+	:param Y:
+		X/Y coordinates, see :func:`plot_grid`
+
+	:return:
+		(xedges, yedges) tuple of 1-D arrays, cell edges along X/Y axis
+		(not necessarily ascending), or None if grid is not regular
+	"""
+	ny, nx = data_shape
+	if X is None and Y is None:
+		## Same edges as pcolormesh without coordinates
+		return (np.arange(nx + 1), np.arange(ny + 1))
+	elif X is None or Y is None:
+		return None
+
+	if len(X) == len(Y) == 2:
+		## X/Y specified as x/ymin / x/ymax
+		return (np.linspace(X[0], X[1], nx + 1), np.linspace(Y[0], Y[1], ny + 1))
+
+	X, Y = np.asarray(X), np.asarray(Y)
+	if X.ndim == Y.ndim == 2:
+		## Rectilinear if all rows of X and all columns of Y are identical
+		if X.shape != Y.shape or not ((X == X[:1]).all() and (Y == Y[:,:1]).all()):
+			return None
+		X, Y = X[0], Y[:,0]
+	elif not X.ndim == Y.ndim == 1:
+		return None
+
+	if not (_is_uniform(X) and _is_uniform(Y)):
+		return None
+
+	if (len(X), len(Y)) == (nx, ny):
+		## Center coordinates
+		dx, dy = (X[-1] - X[0]) / (nx - 1), (Y[-1] - Y[0]) / (ny - 1)
+		return (np.linspace(X[0] - dx / 2., X[-1] + dx / 2., nx + 1),
+				np.linspace(Y[0] - dy / 2., Y[-1] + dy / 2., ny + 1))
+	elif (len(X), len(Y)) == (nx + 1, ny + 1):
+		## Edge coordinates
+		return (X, Y)
+	else:
+		return None
+
+
+def _get_cell_window(edges, vmin=None, vmax=None):
+	"""
+	Determine range of grid cells overlapping an axis interval
+
+	:param edges:
+		1-D array, cell edges (ascending or descending)
+	:param vmin:
+	:param vmax:
+		float, axis limits
+		(default: None)
+
+	:return:
+		(start, stop) tuple of ints, cell index range
+		(all cells if none overlap)
+	"""
+	num_cells = len(edges) - 1
+	lower = np.minimum(edges[:-1], edges[1:])
+	upper = np.maximum(edges[:-1], edges[1:])
+	overlaps = np.ones(num_cells, dtype=bool)
+	if vmin is not None:
+		overlaps &= (upper > vmin)
+	if vmax is not None:
+		overlaps &= (lower < vmax)
+	idxs = np.flatnonzero(overlaps)
+	if not len(idxs):
+		return (0, num_cells)
+	return (idxs[0], idxs[-1] + 1)
+
+
+def _downsample_regular_grid(data, xedges, yedges, num_pixels, reducer='mean',
+							xmin=None, xmax=None, ymin=None, ymax=None,
+							cache=False):
+	"""
+	Reduce regular grid to roughly the output resolution, optionally
+	using cached pyramid levels, and restrict it to the visible window
+
+	:param data:
+		2D array, gridded data
+	:param xedges:
+	:param yedges:
+		1-D arrays, cell edges along X/Y axis
+	:param num_pixels:
+		(width, height) tuple, size of Axes in output pixels
+	:param reducer:
+		str, reducer, see :func:`block_reduce`
+		(default: 'mean')
+	:param xmin:
+	:param xmax:
+	:param ymin:
+	:param ymax:
+		float, axis limits
+		(default: None)
+	:param cache:
+		bool or hashable, whether or not to use cached pyramid levels,
+		or version token of the data (see :func:`get_pyramid_level`)
+		(default: False)
+
+	:return:
+		(data, xedges, yedges, window) tuple:
+		- data: 2D array, reduced grid
+		- xedges, yedges: 1-D arrays, cell edges of reduced grid
+		- window: (row_slice, col_slice, factor) tuple, block-aligned
+		window in original grid and block size, or None if grid was
+		neither reduced nor restricted
+	"""
+	ny, nx = data.shape
+	x0, x1 = _get_cell_window(xedges, xmin, xmax)
+	y0, y1 = _get_cell_window(yedges, ymin, ymax)
+	factor = select_pyramid_level((y1 - y0, x1 - x0), num_pixels[::-1])
+	if factor == (1, 1) and (x1 - x0, y1 - y0) == (nx, ny):
+		return (data, xedges, yedges, None)
+
+	## Align window with blocks
+	fy, fx = factor
+	y0, x0 = (y0 // fy) * fy, (x0 // fx) * fx
+	y1, x1 = min(-(-y1 // fy) * fy, ny), min(-(-x1 // fx) * fx, nx)
+	if factor == (1, 1):
+		reduced = data[y0:y1, x0:x1]
+	elif cache is False or cache is None:
+		reduced = block_reduce(data[y0:y1, x0:x1], factor, reducer)
+	else:
+		version = None if cache is True else cache
+		reduced = get_pyramid_level(data, factor, reducer, version=version)
+		reduced = reduced[y0 // fy:-(-y1 // fy), x0 // fx:-(-x1 // fx)]
+	xedges = xedges[np.append(np.arange(x0, x1, fx), x1)]
+	yedges = yedges[np.append(np.arange(y0, y1, fy), y1)]
+	window = (slice(y0, y1), slice(x0, x1), factor)
+
+	return (reduced, xedges, yedges, window)
+
+
+def _cycle_over_levels(value, level_idxs, is_single):
+	"""
+	Assign property to contour lines, cycling over levels if
+	multiple values are given, as in matplotlib's contour function
+
+	:param value:
+		property value or list of values
+	:param level_idxs:
+		1-D int array, level index of each line
+	:param is_single:
+		bool, whether :param:`value` is a single value
+
+	:return:
+		list, property value for each line
+	"""
+	if is_single:
+		return [value] * len(level_idxs)
+	value = list(value)
+	return [value[idx % len(value)] for idx in level_idxs]
+
+
+def _format_contour_levels(levels, fmt=None):
+	"""
+	Format contour levels for labels, in the same way as
+	matplotlib's clabel function
+
+	:param levels:
+		1-D array, contour levels
+	:param fmt:
+		str, instance of :class:`matplotlib.ticker.Formatter`
+		or callable
+		(default: None, will use ScalarFormatter)
+
+	:return:
+		list of strings
+	"""
+	from matplotlib.ticker import Formatter, ScalarFormatter
+
+	if fmt is None:
+		fmt = ScalarFormatter(useOffset=False)
+		fmt.create_dummy_axis()
+	if isinstance(fmt, Formatter):
+		fmt.set_locs(levels)
+		return [fmt(level) for level in levels]
+	elif callable(fmt):
+		return [fmt(level) for level in levels]
+	else:
+		return [fmt % level for level in levels]
+
+
+def _add_colorbar_axes(ax, cbar_location, cbar_align, inside=False,
+					cax_size=0.1, cax_padding=0.1, cax_shrink=1.,
+					cbar_length=1., cbar_aspect=20):
+	"""
+	Add colorbar Axes next to or inside parent Axes, with a position
+	computed analytically (and cached) by :func:`get_colorbar_layout`,
+	rather than by forcing an aspect pass of the parent Axes
+
+	:param ax:
+		matplotlib Axes instance, parent Axes
+	:param cbar_location:
+		str, side of parent Axes
+	:param cbar_align:
+		str, alignment of colorbar along side of parent Axes
+	:param inside:
+	:param cax_size:
+	:param cax_padding:
+	:param cax_shrink:
+	:param cbar_length:
+	:param cbar_aspect:
+		see :func:`get_colorbar_layout`, except that :param:`cax_padding`
+		is in units of the legend font size if :param:`inside` is True
+
+	:return:
+		matplotlib Axes instance
+	"""
+	from matplotlib.transforms import Bbox
+	from matplotlib.font_manager import FontProperties
+
+	fig = ax.get_figure()
+
+	## Aspect of parent Axes, as determined by matplotlib's apply_aspect
+	ax_box_aspect = ax.get_box_aspect()
+	if (ax_box_aspect is None and ax.get_aspect() != 'auto'
+		and ax.get_adjustable() == 'box'):
+		ax_box_aspect = ax.get_aspect() * ax.get_data_ratio()
+	ax_anchor = ax.get_anchor()
+	if isinstance(ax_anchor, basestring):
+		ax_anchor = Bbox.coefs[ax_anchor]
+
+	if inside:
+		## Padding in font size units, as for inset Axes
+		fontsize = FontProperties(size=matplotlib.rcParams['legend.fontsize'])
+		cax_padding *= fontsize.get_size_in_points() / 72.
+
+	ax_pos, cax_pos = get_colorbar_layout(tuple(fig.get_size_inches()),
+							ax.get_position(original=True).bounds,
+							cbar_location='%s %s' % (cbar_location, cbar_align),
+							inside=inside, cax_size=cax_size,
+							cax_padding=cax_padding, cax_shrink=cax_shrink,
+							cbar_length=cbar_length, cbar_aspect=cbar_aspect,
+							ax_box_aspect=ax_box_aspect, ax_anchor=ax_anchor)
+	if ax_pos is not None:
+		ax.set_position(ax_pos)
+		ax.set_anchor(PARENT_ANCHORS[cbar_location])
+
+	return fig.add_axes(cax_pos, label='<colorbar>')
+
+
+def _plot_contour_lines(ax, Xc, Yc, data, contour_lines, contour_labels=None,
+						contour_color='k', contour_width=0.5, contour_style='-',
+						contour_label_fontsize=None, contour_label_format=None,
+						stats=None):
+	"""
+	Draw contour lines as a single line collection, and label them
+	at precomputed positions (see :func:`compute_contours`)
+
+	:param ax:
+		matplotlib Axes instance
 	:param Xc:
-		2D array (num_lats x num_lons), X center coordinates
 	:param Yc:
-		2D array (num_lats x num_lons), Y center coordinates
+		1D or 2D arrays, X/Y center coordinates
+		or None (grid indexes)
+	:param data:
+		2D array, gridded data
+	:param contour_lines:
+	:param contour_labels:
+	:param contour_color:
+	:param contour_width:
+	:param contour_style:
+	:param contour_label_fontsize:
+		see :func:`plot_grid`
+	:param contour_label_format:
+		str or instance of :class:`matplotlib.ticker.Formatter`,
+		format for contour labels
+	:param stats:
+		instance of :class:`GridStats`, statistics used to determine
+		the levels if :param:`contour_lines` is a number
+		(default: None, will use statistics of :param:`data`)
 
 	:return:
-		(Xe, Ye)
-		2D arrays (num_lats+1 x num_lons+1), X and Y edge coordinates
+		list of matplotlib artists (line collection and labels)
 	"""
-	assert Xc.shape == Yc.shape
-
-	## Output dimension
-	nx, ny = Xc.shape[1] + 1, Xc.shape[0] + 1
-
-	## First pass: compute edge coordinates along respective axes
-	_Xe, _Ye = np.zeros((ny-1, nx)), np.zeros((ny, nx-1))
-	dxx, dyy = np.diff(Xc, axis=1), np.diff(Yc, axis=0)
-	_Xe[:,1:-1] = Xc[:,:-1] + dxx / 2.
-	_Xe[:,:1] = Xc[:,:1] - dxx[:,:1] / 2.
-	_Xe[:,-1:] = Xc[:,-1:] + dxx[:,-1:] / 2.
-	_Ye[1:-1] = Yc[:-1] + dyy / 2.
-	_Ye[:1] = Yc[:1] - dyy[:1] / 2.
-	_Ye[-1:] = Yc[-1:] + dyy[-1:] / 2.
-
-	## Second pass: compute edge coordinates along opposite axes
-	Xe, Ye = np.zeros((ny, nx)), np.zeros((ny, nx))
-	dxy, dyx = np.diff(_Xe, axis=0), np.diff(_Ye, axis=1)
-	Xe[1:-1] = _Xe[:-1] + dxy / 2.
-	Xe[:1] = _Xe[:1] - dxy[:1] / 2.
-	Xe[-1:] = _Xe[-1:] + dxy[-1:] / 2.
-	Ye[:,1:-1] = _Ye[:,:-1] + dyx / 2.
-	Ye[:,:1] = _Ye[:,:1] + dyx[:,:1] / 2.
-	Ye[:,-1:] = _Ye[:,-1:] + dyx[:,-1:] / 2.
-
-	return (Xe, Ye)
-
-
-def grid_edge_to_center_coordinates(Xe, Ye):
+	from matplotlib.collections import LineCollection
+	from matplotlib.colors import is_color_like
+
+	if isinstance(contour_lines, ContourPaths):
+		contours = contour_lines
+	else:
+		contours = compute_contours(data, contour_lines, Xc, Yc, stats=stats)
+
+	## Line properties cycle over levels
+	line_colors = _cycle_over_levels(contour_color, contours.line_levels,
+									is_color_like(contour_color))
+	line_widths = _cycle_over_levels(contour_width, contours.line_levels,
+									np.isscalar(contour_width))
+	line_styles = _cycle_over_levels(contour_style, contours.line_levels,
+									isinstance(contour_style, basestring))
+	lc = LineCollection(contours.get_lines(), colors=line_colors,
+						linewidths=line_widths, linestyles=line_styles)
+	ax.add_collection(lc, autolim=False)
+	artists = [lc]
+
+	## Contour labels
+	if contour_labels is None:
+		contour_labels = contours.levels
+	if len(contour_labels) and len(contours.label_levels):
+		label_values = contours.levels[contours.label_levels]
+		idxs = np.flatnonzero(np.isclose(label_values[:, np.newaxis],
+								np.asarray(contour_labels, dtype=float)).any(axis=1))
+		level_texts = _format_contour_levels(contours.levels,
+											contour_label_format)
+		label_colors = _cycle_over_levels(contour_color, contours.label_levels,
+										is_color_like(contour_color))
+		## Keep labels upright, rotation follows axis scaling when drawn
+		## (vertical segments have dx == 0 and are rotated by +/-90 degrees)
+		dx, dy = contours.label_directions.T
+		angles = np.degrees(np.arctan2(dy * np.where(dx < 0, -1, 1), np.abs(dx)))
+
+		texts = []
+		for i in idxs:
+			(x, y), level_idx = contours.label_positions[i], contours.label_levels[i]
+			txt = ax.text(x, y, level_texts[level_idx], rotation=angles[i],
+						rotation_mode='anchor', transform_rotates_text=True,
+						ha='center', va='center', color=label_colors[i],
+						fontsize=contour_label_fontsize, clip_on=True,
+						bbox=dict(boxstyle='square,pad=0.1', fc='white',
+								ec='none'))
+			texts.append(txt)
+		artists.extend(texts)
+
+		## Labels overlapping previous labels are hidden when drawn,
+		## once axis limits and Axes position are final
+		culler = LabelCuller(texts)
+		ax.add_artist(culler)
+		artists.append(culler)
+
+	return artists
+
+
+class GridPlot(object):
 	"""
-	Transform grid (or mesh) edge coordinates to center coordinates
+	Handle to a plot created by :func:`plot_grid` with
+	:param:`return_handle` set to True, allowing to redraw it with
+	new data of the same shape (e.g., successive frames of an
+	animation) without rebuilding coordinates, colorbar and frame.
 
-	:param Xe:
-		2D array (num_lats x num_lons), X edge coordinates
-	:param Ye:
-		2D array (num_lats x num_lons), Y edge coordinates
+	Color scaling (norm, vmin/vmax, colorbar) is retained from the
+	original plot, so :param:`vmin` and :param:`vmax` or :param:`norm`
+	should normally be specified in :func:`plot_grid`
 
-	:return:
-		(Xc, Yc)
-		2D arrays (num_lats-1 x num_lons-1), X and Y center coordinates
+	:param ax:
+		matplotlib Axes instance
+	:param mappable:
+		matplotlib artist representing the data (AxesImage, QuadMesh
+		or QuadContourSet)
+	:param flip_x:
+	:param flip_y:
+		bool, whether data columns/rows are reversed in the image
+		(default: False)
+	:param downsample:
+		(reducer, window) tuple, see :func:`_downsample_regular_grid`,
+		if data were reduced
+		(default: None)
+	:param contourf_args:
+		(coords, V, kwargs) tuple, arguments for :meth:`ax.contourf`
+		if grid is smoothed
+		(default: None)
+	:param contour_artists:
+		list of matplotlib artists, contour lines and labels
+		(default: [])
+	:param contour_args:
+		dict, arguments for :func:`_plot_contour_lines`, except data
+		(default: {})
+	:param fig_filespec:
+	:param dpi:
+	:param border_width:
+		see :func:`show_or_save_plot`
+	:param style_sheet:
+		str, dict or list, style sheet to apply while saving
+		in headless mode
+		(default: 'classic')
+	:param headless:
+		bool, whether or not figure was created in headless mode
+		(default: False)
 	"""
-	## Output dimension
-	nx, ny = Xe.shape[1] - 1, Xe.shape[0] - 1
+	def __init__(self, ax, mappable, flip_x=False, flip_y=False, downsample=None,
+				contourf_args=None, contour_artists=[], contour_args={},
+				fig_filespec=None, dpi=300, border_width=0.2,
+				style_sheet='classic', headless=False):
+		self.ax = ax
+		self.mappable = mappable
+		self.flip_x = flip_x
+		self.flip_y = flip_y
+		self.downsample = downsample
+		self.contourf_args = contourf_args
+		self.contour_artists = contour_artists
+		self.contour_args = contour_args
+		self.fig_filespec = fig_filespec
+		self.dpi = dpi
+		self.border_width = border_width
+		self.style_sheet = style_sheet
+		self.headless = headless
+
+	@property
+	def fig(self):
+		return self.ax.get_figure()
+
+	def update(self, data, fig_filespec=None, contours=True):
+		"""
+		Replace grid data and save plot
+
+		:param data:
+			2D array, gridded data, same shape as original data,
+			or str, full path to .npy file (will be memory-mapped)
+		:param fig_filespec:
+			str, full path to output file
+			(default: None, will use :param:`fig_filespec` of
+			:func:`plot_grid` if it was a file)
+		:param contours:
+			bool, whether or not contour lines should be recomputed
+			(if there are any)
+			(default: True)
 
-	## First pass: compute center coordinates along respective axes
-	_Xc, _Yc = np.zeros((ny+1, nx)), np.zeros((ny, nx+1))
-	dxx, dyy = np.diff(Xe, axis=1), np.diff(Ye, axis=0)
-	_Xc = Xe[:,:-1] + dxx / 2.
-	_Yc = Ye[:-1] + dyy / 2.
+		:return:
+			None if plot was saved, else matplotlib Axes instance
+		"""
+		data = full_data = np.asanyarray(load_array(data))
+		if self.downsample is not None:
+			reducer, (row_slice, col_slice, factor) = self.downsample
+			data = data[row_slice, col_slice]
+			if factor != (1, 1):
+				data = block_reduce(data, factor, reducer)
+		if self.contourf_args is not None:
+			coords, V, kwargs = self.contourf_args
+			self.mappable.remove()
+			self.mappable = self.ax.contourf(*(coords + (data, V)), **kwargs)
+		else:
+			img_data = data
+			if self.flip_x:
+				img_data = img_data[:,::-1]
+			if self.flip_y:
+				img_data = img_data[::-1]
+			self.mappable.set_array(img_data)
+
+		if (self.contour_artists and contours
+			and not isinstance(self.contour_args['contour_lines'], ContourPaths)):
+			for artist in self.contour_artists:
+				artist.remove()
+			## Number of levels is resolved on full-resolution data
+			stats = None
+			if (self.downsample is not None
+				and np.isscalar(self.contour_args['contour_lines'])):
+				stats = GridStats(full_data, sample_size=None)
+			self.contour_artists = _plot_contour_lines(self.ax, data=data,
+											stats=stats, **self.contour_args)
+
+		return self.save(fig_filespec)
+
+	def save(self, fig_filespec=None):
+		"""
+		Save plot, keeping the figure intact for further updates
 
-	## Second pass: compute center coordinates along opposite axes
-	dxy, dyx = np.diff(_Xc, axis=0), np.diff(_Yc, axis=1)
-	Xc = _Xc[:-1] + dxy / 2.
-	Yc = _Yc[:,:-1] + dyx / 2.
+		:param fig_filespec:
+			str, full path to output file
+			(default: None, will use :param:`fig_filespec` of
+			:func:`plot_grid` if it was a file)
 
-	return (Xc, Yc)
+		:return:
+			None if plot was saved, else matplotlib Axes instance
+		"""
+		fig_filespec = fig_filespec or self.fig_filespec
+		if not fig_filespec or fig_filespec == 'wait':
+			return self.ax
+
+		## Note: headless=True, otherwise show_or_save_plot clears pyplot figure
+		save_args = dict(fig_filespec=fig_filespec, dpi=self.dpi,
+						border_width=self.border_width, headless=True)
+		if self.headless:
+			with shared_style_context(self.style_sheet):
+				show_or_save_plot(self.ax, **save_args)
+		else:
+			show_or_save_plot(self.ax, **save_args)
 
 
+@headless_aware
 def plot_grid(data, X=None, Y=None,
 			cmap='jet', norm=None, vmin=None, vmax=None,
 			color_gradient='cont', shading=False, smoothed=False,
@@ -106,7 +546,8 @@ def plot_grid(data, X=None, Y=None,
 			cbar_extend='neither', cbar_lines=False, cbar_range='full',
 			contour_lines=None, contour_color='k', contour_width=0.5,
 			contour_style='-', contour_labels=None, contour_label_fontsize=None,
-			alpha=1,
+			alpha=1, downsample='mean', pyramid_cache=False, stats=None,
+			return_handle=False,
 			xscaling='lin', yscaling='lin',
 			xmin=None, xmax=None, ymin=None, ymax=None,
 			xlabel='', ylabel='', ax_label_fontsize='large',
@@ -119,12 +560,16 @@ def plot_grid(data, X=None, Y=None,
 			xgrid=0, ygrid=0, aspect_ratio=None,
 			hlines=[], hline_args={}, vlines=[], vline_args={},
 			style_sheet='classic', border_width=0.2, skip_frame=False,
-			fig_filespec=None, figsize=None, dpi=300, ax=None):
+			fig_filespec=None, figsize=None, dpi=300, ax=None, headless=False):
 	"""
 	Plot raster or mesh data
 
 	:param data:
-		2D array, gridded data
+		2D array, gridded data, may be a (memory-mapped) numpy array
+		or masked array. NaN values are drawn with the "bad" color
+		of :param:`cmap` (transparent by default).
+		Alternatively, str, full path to .npy file, which will be
+		memory-mapped
 	:param X/Y:
 		[x/ymin, x/ymax] or 1D array or 2D array or None, X/Y coodinates
 		dimension may be either the same as data (= center coordinates)
@@ -228,6 +673,11 @@ def plot_grid(data, X=None, Y=None,
 		- 'None' or 0 = no contours
 		- N (int): number of contours
 		- list or array specifying contour values
+		- instance of :class:`ContourPaths`, precomputed contours
+		  (see :func:`compute_contours`), e.g., to overlay the same
+		  contours on several plots
+		Contours are drawn as a line collection, with labels at
+		precomputed positions
 		(default: None)
 	:param contour_color:
 		matplotlib color specification (or list), color to use for contour
@@ -248,6 +698,40 @@ def plot_grid(data, X=None, Y=None,
 	:param alpha:
 		float in the range 0 - 1, grid opacity
 		(default: 1)
+	:param downsample:
+		str, how to reduce regular grids that are much larger than
+		the output resolution (in pixels) before rendering:
+		'mean', 'max' or 'nearest' (see :func:`block_reduce`),
+		or None to disable. Grids are reduced by powers of 2,
+		so that at least one cell remains per pixel, and only the part
+		within :param:`xmin`, :param:`xmax`, :param:`ymin` and
+		:param:`ymax` is rendered. Contour lines are computed on
+		the reduced grid as well, but the number of contour levels,
+		the default discrete norm and the colorbar range are
+		determined from the full-resolution data.
+		(default: 'mean')
+	:param pyramid_cache:
+		bool or hashable, whether or not to cache reduced grids as long
+		as :param:`data` exists, for subsequent plots of (parts of) the
+		same grid. The cache cannot detect if :param:`data` is modified
+		in place, in that case a version token that changes with the
+		data should be given instead of True
+		(see :func:`get_pyramid_level`)
+		(default: False)
+	:param stats:
+		instance of :class:`GridStats`, precomputed statistics of the
+		data, used for the default discrete norm, for autoscaling the
+		colorbar, if :param:`cbar_range` is 'data' and to determine
+		the levels if :param:`contour_lines` is a number. Can be used
+		to share the same statistics between frames or panels
+		(default: None, will compute statistics of the full-resolution
+		data when needed)
+	:param return_handle:
+		bool, whether or not to return an instance of :class:`GridPlot`,
+		which can be used to redraw the plot with new data of the same
+		shape (e.g., animation frames) at a fraction of the cost.
+		The plot is saved if :param:`fig_filespec` is a file
+		(default: False)
 	"""
 	frame_args = {key: val for (key, val) in locals().items()
 				if not key in ['data', 'X', 'Y', 'cmap', 'norm', 'vmin', 'vmax',
@@ -260,17 +744,20 @@ def plot_grid(data, X=None, Y=None,
 							'cbar_extend', 'cbar_lines', 'cbar_range',
 							'contour_lines', 'contour_color', 'contour_width',
 							'contour_style', 'contour_labels',
-							'contour_label_fontsize', 'alpha', 'style_sheet',
-							'border_width', 'skip_frame', 'fig_filespec',
-							'figsize', 'dpi', 'ax', 'kwargs']}
+							'contour_label_fontsize', 'alpha', 'downsample',
+							'pyramid_cache', 'stats', 'return_handle',
+							'style_sheet', 'border_width', 'skip_frame',
+							'fig_filespec', 'figsize', 'dpi', 'ax', 'headless',
+							'kwargs']}
 
-	from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 	from matplotlib.colors import BoundaryNorm
-	from matplotlib.colorbar import make_axes, ColorbarBase
+	from matplotlib.colorbar import ColorbarBase
 	from mapping.layeredbasemap.cm.norm import (PiecewiseLinearNorm,
 												PiecewiseConstantNorm)
 
-	pylab.style.use(style_sheet)
+	if not headless:
+		import pylab
+		pylab.style.use(style_sheet)
 
 	if cbar_title_fontsize is None:
 		cbar_title_fontsize = ax_label_fontsize
@@ -280,12 +767,16 @@ def plot_grid(data, X=None, Y=None,
 		contour_label_fontsize = cbar_label_fontsize
 
 	if ax is None:
-		if fig_filespec:
+		if fig_filespec and not headless:
 			pylab.ioff()
-		fig, ax = pylab.subplots(figsize=figsize, facecolor='white')
+		fig, ax = create_fig_and_ax(figsize=figsize, headless=headless)
 	else:
 		fig = ax.get_figure()
 
+	## Memory-mapped grids are not copied, NaN values are masked
+	## by matplotlib in the (downsampled) data that is rendered
+	data = full_data = np.asanyarray(load_array(data))
+
 	## Determine if we need center or edge coordinates or both
 	need_center_coordinates = False
 	need_edge_coordinates = False
@@ -294,8 +785,29 @@ def plot_grid(data, X=None, Y=None,
 	if not smoothed:
 		need_edge_coordinates = True
 
+	## Regular grids are drawn as an image, without constructing
+	## mesh and edge coordinates
+	regular_edges = None
+	if not (smoothed or shading) and xscaling[:3] == yscaling[:3] == 'lin':
+		regular_edges = _get_regular_edges(data.shape, X, Y)
+
 	## Construct X/Y arrays
-	if X is not None and Y is not None:
+	Xc = Yc = None
+	downsample_window = None
+	if regular_edges is not None:
+		xedges, yedges = regular_edges
+		if downsample:
+			num_pixels = get_ax_pixel_size(ax, dpi if fig_filespec else None)
+			(data, xedges, yedges,
+			downsample_window) = _downsample_regular_grid(data, xedges, yedges,
+											num_pixels, downsample, xmin=xmin,
+											xmax=xmax, ymin=ymin, ymax=ymax,
+											cache=pyramid_cache)
+		## 1-D center coordinates are sufficient for contouring
+		Xc = (xedges[:-1] + xedges[1:]) / 2.
+		Yc = (yedges[:-1] + yedges[1:]) / 2.
+
+	elif X is not None and Y is not None:
 		if len(X) == len(Y) == 2:
 			## X/Y specified as x/ymin / x/ymax
 			nx, ny = data.shape[1], data.shape[0]
@@ -304,8 +816,8 @@ def plot_grid(data, X=None, Y=None,
 			X = np.linspace(X[0], X[1], nx)
 			Y = np.linspace(Y[0], Y[1], ny)
 		if len(X.shape) == len(Y.shape) == 1:
-			## X/Y are 1D arrays
-			X, Y = np.meshgrid(X, Y)
+			## X/Y are 1D arrays, use broadcast views rather than full meshes
+			X, Y = np.broadcast_arrays(*np.meshgrid(X, Y, sparse=True))
 
 		if X.shape == data.shape:
 			## Center coordinates
@@ -326,10 +838,6 @@ def plot_grid(data, X=None, Y=None,
 		else:
 			raise Exception('Dimensions of data and coordinates do not match!')
 
-	## Mask NaN values
-	if not isinstance(data, np.ma.MaskedArray):
-		data = np.ma.masked_array(data, mask=np.isnan(data))
-
 	if isinstance(cmap, basestring):
 		cmap = matplotlib.cm.get_cmap(cmap)
 
@@ -337,11 +845,13 @@ def plot_grid(data, X=None, Y=None,
 	## in the color palette if color_gradient is 'discontinuous'
 	if color_gradient[:4] == 'disc':
 		if norm is None:
-			if vmin is None:
-				vmin = np.nanmin(data)
-			if vmax is None:
-				vmax = np.nanmax(data)
-			norm = BoundaryNorm(np.linspace(vmin, vmax, 8), cmap.N)
+			if (vmin is None or vmax is None) and stats is None:
+				stats = GridStats(full_data, sample_size=None)
+			norm_min = stats.min if vmin is None else vmin
+			norm_max = stats.max if vmax is None else vmax
+			norm = BoundaryNorm(np.linspace(norm_min, norm_max, 8), cmap.N)
+			## Limits are defined by the norm
+			vmin = vmax = None
 		if isinstance(norm, PiecewiseLinearNorm):
 			norm = norm.to_piecewise_constant_norm()
 		elif not isinstance(norm, (PiecewiseConstantNorm, BoundaryNorm)):
@@ -350,8 +860,21 @@ def plot_grid(data, X=None, Y=None,
 			if not isinstance(cmap, matplotlib.colors.Colormap):
 				cmap = matplotlib.cm.get_cmap(cmap, 10)
 
+	## Autoscale colors on full-resolution data rather than on reduced grid
+	if downsample_window is not None and (vmin is None or vmax is None):
+		if stats is None:
+			stats = GridStats(full_data, sample_size=None)
+		if stats.count:
+			if norm is None:
+				vmin = stats.min if vmin is None else vmin
+				vmax = stats.max if vmax is None else vmax
+			elif isinstance(norm, matplotlib.colors.Normalize):
+				norm.autoscale_None(np.array(stats.data_range))
+
 	## Plot grid
 	cs = None
+	contourf_args = None
+	flip_x = flip_y = False
 	common_kwargs = {'cmap': cmap, 'norm': norm, 'vmin': vmin, 'vmax': vmax,
 					'alpha': alpha}
 
@@ -362,22 +885,34 @@ def plot_grid(data, X=None, Y=None,
 				V = getattr(norm, 'breakpoints')
 			except:
 				V = getattr(norm, 'boundaries')
-			if X is None and Y is None:
-				cs = ax.contourf(data, V, **common_kwargs)
-			else:
-				cs = ax.contourf(Xc, Yc, data, V, **common_kwargs)
 		else:
 			#V = 1100
 			V = cmap.N
-			if X is None and Y is None:
-				cs = ax.contourf(data, V, **common_kwargs)
-			else:
-				cs = ax.contourf(Xc, Yc, data, V, **common_kwargs)
+		if X is None and Y is None:
+			coords = ()
+		else:
+			coords = (Xc, Yc)
+		cs = ax.contourf(*(coords + (data, V)), **common_kwargs)
+		contourf_args = (coords, V, common_kwargs)
 
 	else:
 		## both pcolor and pcolormesh need edge coordinates,
 		## except if shading == 'gouraud'
-		if X is None and Y is None:
+		if regular_edges is not None:
+			## Image rows and columns must be in ascending order
+			img_data = data
+			flip_x, flip_y = xedges[0] > xedges[-1], yedges[0] > yedges[-1]
+			if flip_x:
+				xedges, img_data = xedges[::-1], img_data[:,::-1]
+			if flip_y:
+				yedges, img_data = yedges[::-1], img_data[::-1]
+			extent = (xedges[0], xedges[-1], yedges[0], yedges[-1])
+			cs = ax.imshow(img_data, origin='lower', extent=extent, aspect='auto',
+							interpolation='nearest', **common_kwargs)
+			## Autoscale axis limits like pcolormesh
+			ax.autoscale_view()
+
+		elif X is None and Y is None:
 			shading = {True: 'gouraud', False: 'flat'}[shading]
 			cs = ax.pcolormesh(data, shading=shading, **common_kwargs)
 			# or use imshow, which has interpolation possibilities?
@@ -389,20 +924,20 @@ def plot_grid(data, X=None, Y=None,
 				cs = ax.pcolormesh(Xe, Ye, data, shading='flat', **common_kwargs)
 
 	## Contour lines
-	if contour_lines is not None:
-		# X and Y must have same shape as data !
-		cl = ax.contour(Xc, Yc, data, contour_lines, colors=contour_color,
-					linewidths=contour_width, linestyles=contour_style)
-
-		## Contour labels:
-		if contour_labels is None:
-			contour_labels = contour_lines
-		if contour_labels is not None:
-			clabels = ax.clabel(cl, contour_labels, colors=contour_color, inline=True,
-								fontsize=contour_label_fontsize, fmt=cbar_label_format)
-		# TODO: white background for contour labels
-		#bbox_args = label_style.to_kwargs()['bbox']
-		#[txt.set_bbox(bbox_args) for txt in clabels]
+	contour_artists = []
+	contour_args = dict(Xc=Xc, Yc=Yc, contour_lines=contour_lines,
+						contour_labels=contour_labels, contour_color=contour_color,
+						contour_width=contour_width, contour_style=contour_style,
+						contour_label_fontsize=contour_label_fontsize,
+						contour_label_format=cbar_label_format)
+	if contour_lines is not None and not (np.isscalar(contour_lines)
+										and contour_lines == 0):
+		## Number of levels is resolved on full-resolution data
+		if (np.isscalar(contour_lines) and stats is None
+			and downsample_window is not None):
+			stats = GridStats(full_data, sample_size=None)
+		contour_artists = _plot_contour_lines(ax, data=data, stats=stats,
+											**contour_args)
 
 	## Frame
 	if not skip_frame:
@@ -433,42 +968,10 @@ def plot_grid(data, X=None, Y=None,
 			#pad = axes_size.Fraction(cbar_padding, size)
 			#cax = divider.append_axes(cbar_location, size=size, pad=pad)
 
-			cbar_aspect *= cbar_length
-			cax, _ = make_axes(ax, location=cbar_location, fraction=cax_size,
-							aspect=cbar_aspect, shrink=cax_shrink, pad=cax_padding)
-
-			## Necessary for ax.get_position to return correct size
-			ax.apply_aspect()
-			ax_pos = ax.get_position(original=False)
-
-			cax_pos = cax.get_position()
-			left, bottom = cax_pos.x0, cax_pos.y0
-			width, height = cax_pos.width, cax_pos.height
-			if cbar_orientation == 'vertical':
-				bottom, height = ax_pos.y0, ax_pos.height
-				unshrinked_height = height / cax_shrink
-				center = bottom + height / 2
-				height *= cbar_length
-				if cbar_align == 'center':
-					bottom = center - height / 2
-				elif cbar_align == 'top':
-					top = center + unshrinked_height / 2
-					bottom = top - height
-				elif cbar_align == 'bottom':
-					bottom = center - unshrinked_height / 2
-			elif cbar_orientation == 'horizontal':
-				left, width = ax_pos.x0, ax_pos.width
-				unshrinked_width = width / cax_shrink
-				center = left + width / 2
-				width *= cbar_length
-				if cbar_align == 'center':
-					left = center - width / 2
-				elif cbar_align == 'right':
-					right = center + unshrinked_width / 2
-					left = right - width
-				elif cbar_align == 'left':
-					left = center - unshrinked_width / 2
-			cax.set_position((left, bottom, width, height))
+			cax = _add_colorbar_axes(ax, cbar_location, cbar_align,
+								inside=False, cax_size=cax_size,
+								cax_padding=cax_padding, cax_shrink=cax_shrink,
+								cbar_length=cbar_length, cbar_aspect=cbar_aspect)
 
 		elif isinstance(cax, tuple):
 			## Test
@@ -476,33 +979,16 @@ def plot_grid(data, X=None, Y=None,
 			cax = None
 
 		elif cax == 'inside':
-			if cbar_orientation == 'horizontal':
-				width = cbar_length
-				height = width / cbar_aspect
-				loc = cbar_location + ' ' + cbar_align
-			else:
-				height = cbar_length
-				width = height / cbar_aspect
-				loc = cbar_align + ' ' + cbar_location
-			width = '%.0f%%' % (width * 100)
-			height = '%.0f%%' % (height * 100)
-			loc = loc.replace('top', 'upper').replace('bottom', 'lower')
-			loc = {'upper right': 1,
-					'upper left': 2,
-					'lower left': 3,
-					'lower right': 4,
-					'right': 5,
-					'center left': 6,
-					'center right': 7,
-					'lower center': 8,
-					'upper center': 9,
-					'center': 10}[loc]
-			cax = inset_axes(ax, width=width, height=height, loc=loc,
-							borderpad=cax_padding)
+			cax = _add_colorbar_axes(ax, cbar_location, cbar_align,
+								inside=True, cax_padding=cax_padding,
+								cbar_length=cbar_length, cbar_aspect=cbar_aspect)
 
 		if cax:
+			if stats is None:
+				stats = GridStats(full_data, sample_size=None)
 			sm = matplotlib.cm.ScalarMappable(cmap=cmap, norm=norm)
-			sm.set_array(data)
+			## Only data range is needed for autoscaling
+			sm.set_array(np.array(stats.data_range))
 			if color_gradient == 'disc':
 				try:
 					boundaries = getattr(norm, 'breakpoints')
@@ -513,15 +999,15 @@ def plot_grid(data, X=None, Y=None,
 				if cbar_extend in ('right', 'both'):
 					boundaries = np.hstack([boundaries, [1E+12]])
 				if cbar_range == 'data':
-					start = np.where(boundaries < np.nanmin(data))[0][-1]
-					end = np.where(boundaries > np.nanmax(data))[0][0]
+					start = np.where(boundaries < stats.min)[0][-1]
+					end = np.where(boundaries > stats.max)[0][0]
 					boundaries = boundaries[start:end+1]
 			else:
 				boundaries = None
 				if cbar_range == 'data':
-					sm.set_clim(vmin=np.nanmin(data), vmax=np.nanmax(data))
+					sm.set_clim(vmin=stats.min, vmax=stats.max)
 
-			cbar = pylab.colorbar(sm, cax=cax, orientation=cbar_orientation,
+			cbar = fig.colorbar(sm, cax=cax, orientation=cbar_orientation,
 							spacing=cbar_spacing, ticks=cbar_ticks,
 							format=cbar_label_format, extend=cbar_extend,
 							drawedges=cbar_lines, boundaries=boundaries)
@@ -542,7 +1028,22 @@ def plot_grid(data, X=None, Y=None,
 
 
 	## Output
+	if return_handle:
+		if downsample_window is not None:
+			downsample = (downsample, downsample_window)
+		else:
+			downsample = None
+		handle = GridPlot(ax, cs, flip_x=flip_x, flip_y=flip_y,
+						downsample=downsample,
+						contourf_args=contourf_args,
+						contour_artists=contour_artists,
+						contour_args=contour_args, fig_filespec=fig_filespec,
+						dpi=dpi, border_width=border_width,
+						style_sheet=style_sheet, headless=headless)
+		handle.save()
+		return handle
+
 	return show_or_save_plot(ax, fig_filespec=fig_filespec, dpi=dpi,
-							border_width=border_width)
+							border_width=border_width, headless=headless)
 
 plot_grid.__doc__ += (ax_frame_doc + common_doc)
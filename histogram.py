@@ -11,18 +11,19 @@ except:
 	## Python 3
 	basestring = str
 import numpy as np
-import pylab
 import matplotlib
 from matplotlib.font_manager import FontProperties
 
 
-from .common import (show_or_save_plot, common_doc)
+from .common import (show_or_save_plot, common_doc, headless_aware,
+					create_fig_and_ax)
 from .frame import (plot_ax_frame, ax_frame_doc)
 
 
 __all__ = ['plot_histogram']
 
 
+@headless_aware
 def plot_histogram(datasets, bins, data_is_binned=False, weights=None,
 				histogram_type='bar', stacked=True, cumulative=False, normed=False,
 				orientation='vertical', align='mid', bar_width=0.8, baseline=0,
@@ -41,7 +42,7 @@ def plot_histogram(datasets, bins, data_is_binned=False, weights=None,
 				hlines=[], hline_args={}, vlines=[], vline_args={},
 				legend_location=0, legend_fontsize='medium',
 				style_sheet='classic', border_width=0.2, skip_frame=False,
-				fig_filespec=None, figsize=None, dpi=300, ax=None):
+				fig_filespec=None, figsize=None, dpi=300, ax=None, headless=False):
 	"""
 	Plot histograms
 
@@ -111,21 +112,23 @@ def plot_histogram(datasets, bins, data_is_binned=False, weights=None,
 							'line_color', 'line_width',
 							'legend_location', 'legend_fontsize', 'style_sheet',
 							'border_width', 'skip_frame', 'fig_filespec',
-							'figsize', 'dpi', 'ax']}
+							'figsize', 'dpi', 'ax', 'headless']}
 
 	from itertools import cycle
 
-	pylab.style.use(style_sheet)
+	if not headless:
+		import pylab
+		pylab.style.use(style_sheet)
 
 	if ax is None:
-		fig, ax = pylab.subplots(figsize=figsize, facecolor='white')
+		fig, ax = create_fig_and_ax(figsize=figsize, headless=headless)
 	else:
 		fig = ax.get_figure()
 
 	## markers, colors, linewidhts, linestyles, labels, etc.
 	if not colors:
 		#colors = 'bgrcmyk'
-		colors = pylab.rcParams['axes.prop_cycle'].by_key()['color']
+		colors = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
 		colors = colors[:len(datasets)]
 	if isinstance(colors, basestring):
 		colors = matplotlib.cm.get_cmap(colors)
@@ -164,7 +167,7 @@ def plot_histogram(datasets, bins, data_is_binned=False, weights=None,
 
 	if len(datasets) == 1 and len(colors) > 1 and histogram_type[:3] == 'bar':
 		if not data_is_binned:
-			bar_heights, bin_edges = pylab.histogram(datasets[0], bins=bins,
+			bar_heights, bin_edges = np.histogram(datasets[0], bins=bins,
 												density=normed, weights=weights)
 		else:
 			bin_edges = bins
@@ -227,6 +230,6 @@ def plot_histogram(datasets, bins, data_is_binned=False, weights=None,
 
 	## Output
 	return show_or_save_plot(ax, fig_filespec=fig_filespec, dpi=dpi,
-							border_width=border_width)
+							border_width=border_width, headless=headless)
 
 plot_histogram.__doc__ += (ax_frame_doc + common_doc)
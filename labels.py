@@ -0,0 +1,262 @@
+"""
+Fast placement of text labels at data points, and draw-time culling
+of overlapping labels
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+import numpy as np
+from matplotlib.artist import Artist
+
+
+__all__ = ['add_point_labels', 'estimate_label_extents',
+			'select_non_overlapping', 'LabelCuller']
+
+
+## Approximate text extent relative to font size
+CHAR_WIDTH = 0.6
+LINE_HEIGHT = 1.2
+DESCENT = 0.25
+
+## Relative anchor position corresponding to text alignment
+HA_COEFS = {'left': 0., 'center': 0.5, 'right': 1.}
+VA_COEFS = {'bottom': 0., 'baseline': DESCENT / LINE_HEIGHT,
+			'center_baseline': 0.5, 'center': 0.5, 'top': 1.}
+
+
+def estimate_label_extents(labels, fontsize_px):
+	"""
+	Estimate width and height of text labels without running the
+	text layout engine
+
+	:param labels:
+		list of strings
+	:param fontsize_px:
+		float, font size in pixels
+
+	:return:
+		(widths, heights) tuple of 1-D float arrays
+	"""
+	num_chars = np.empty(len(labels))
+	num_lines = np.empty(len(labels))
+	for i, label in enumerate(labels):
+		lines = ('%s' % label).split('\n')
+		num_chars[i] = max(len(line) for line in lines)
+		num_lines[i] = len(lines)
+	widths = num_chars * CHAR_WIDTH * fontsize_px
+	heights = num_lines * LINE_HEIGHT * fontsize_px
+
+	return (widths, heights)
+
+
+def select_non_overlapping(x0, y0, x1, y1):
+	"""
+	Greedily select boxes that do not overlap any previously selected
+	box, using a uniform grid hash to find candidate neighbours
+
+	:param x0, y0, x1, y1:
+		1-D float arrays, box corners (display coordinates)
+
+	:return:
+		1-D int array, indexes of selected boxes
+	"""
+	if not len(x0):
+		return np.array([], dtype=int)
+
+	cell_width = max(np.median(x1 - x0), 1.)
+	cell_height = max(np.median(y1 - y0), 1.)
+	col0 = np.floor(x0 / cell_width).astype(int)
+	col1 = np.floor(x1 / cell_width).astype(int)
+	row0 = np.floor(y0 / cell_height).astype(int)
+	row1 = np.floor(y1 / cell_height).astype(int)
+
+	grid = {}
+	selected = []
+	for i in range(len(x0)):
+		cells = [(col, row) for col in range(col0[i], col1[i] + 1)
+				for row in range(row0[i], row1[i] + 1)]
+		overlaps = False
+		for cell in cells:
+			for j in grid.get(cell, []):
+				if (x0[i] < x1[j] and x0[j] < x1[i]
+					and y0[i] < y1[j] and y0[j] < y1[i]):
+					overlaps = True
+					break
+			if overlaps:
+				break
+		if not overlaps:
+			selected.append(i)
+			for cell in cells:
+				grid.setdefault(cell, []).append(i)
+
+	return np.array(selected, dtype=int)
+
+
+def add_point_labels(ax, x, y, labels, fontsize='small', allow_overlap=True,
+					**kwargs):
+	"""
+	Label data points, skipping labels of points outside the axis
+	limits, duplicate labels at the same position and, optionally,
+	labels that would overlap previously placed labels.
+	Should be called after axis limits have been set.
+
+	:param ax:
+		matplotlib Axes instance
+	:param x:
+		1-D array, X coordinates of points (values or datetimes)
+	:param y:
+		1-D array, Y coordinates of points (values or datetimes)
+	:param labels:
+		list of strings, labels for each point
+	:param fontsize:
+		int or str, font size of labels
+		(default: 'small')
+	:param allow_overlap:
+		bool, whether or not labels may overlap. If False, labels are
+		placed in order and dropped if they overlap a placed label.
+		Overlap is estimated from the number of characters and the
+		font size
+		(default: True)
+	:param kwargs:
+		additional keyword arguments understood by :meth:`ax.annotate`
+
+	:return:
+		list with instances of :class:`matplotlib.text.Annotation`
+	"""
+	from matplotlib.font_manager import FontProperties
+
+	if not len(labels):
+		return []
+
+	x = np.asarray(ax.convert_xunits(list(x)), dtype=np.float64)
+	y = np.asarray(ax.convert_yunits(list(y)), dtype=np.float64)
+	labels = list(labels)
+
+	## Display coordinates at figure resolution
+	if ax.get_aspect() != 'auto':
+		ax.apply_aspect()
+	xy_display = ax.transData.transform(np.column_stack([x, y]))
+	px, py = xy_display[:,0], xy_display[:,1]
+
+	## Cull points outside axes (also removes NaNs)
+	bbox = ax.bbox
+	idxs = np.where((px >= bbox.x0) & (px <= bbox.x1)
+					& (py >= bbox.y0) & (py <= bbox.y1))[0]
+
+	## Skip identical labels at the same position
+	unique_keys, unique_idxs = set(), []
+	for i in idxs:
+		key = (labels[i], round(px[i], 1), round(py[i], 1))
+		if not key in unique_keys:
+			unique_keys.add(key)
+			unique_idxs.append(i)
+	idxs = np.array(unique_idxs, dtype=int)
+
+	if not allow_overlap and len(idxs):
+		fig = ax.get_figure()
+		fontsize_px = FontProperties(size=fontsize).get_size_in_points() * fig.dpi / 72.
+		widths, heights = estimate_label_extents([labels[i] for i in idxs],
+												fontsize_px)
+		## Annotations are anchored at the left baseline
+		x0, y0 = px[idxs], py[idxs] - DESCENT * fontsize_px
+		selected = select_non_overlapping(x0, y0, x0 + widths, y0 + heights)
+		idxs = idxs[selected]
+
+	kwargs.setdefault('clip_on', True)
+	return [ax.annotate(labels[i], (x[i], y[i]), fontsize=fontsize, **kwargs)
+			for i in idxs]
+
+
+class LabelCuller(Artist):
+	"""
+	Invisible artist that hides text labels overlapping previously
+	placed labels or anchored outside the Axes each time the Axes is
+	drawn, i.e., once axis limits and Axes position are final.
+	Labels are considered in the order
+	given, and their extent is estimated from the number of characters
+	and the font size, taking into account rotation and alignment.
+
+	Note that the visibility of the labels is controlled by this
+	artist, which is drawn before all other artists of the Axes.
+
+	:param texts:
+		list with instances of :class:`matplotlib.text.Text`
+	"""
+	def __init__(self, texts):
+		super(LabelCuller, self).__init__()
+		self.texts = list(texts)
+		self.set_zorder(-np.inf)
+		self.set_in_layout(False)
+
+	def cull(self, renderer=None):
+		"""
+		Hide overlapping labels, show the other ones
+
+		:param renderer:
+			matplotlib renderer
+			(default: None, will use figure resolution)
+
+		:return:
+			1-D int array, indexes of visible labels
+		"""
+		if not self.texts:
+			return np.array([], dtype=int)
+		if renderer is None:
+			px_per_pt = self.texts[0].get_figure().dpi / 72.
+		else:
+			px_per_pt = renderer.points_to_pixels(1.)
+
+		xy = np.array([text.get_transform().transform(text.get_unitless_position())
+						for text in self.texts]).reshape(-1, 2)
+		angles = np.radians([text.get_rotation() for text in self.texts])
+		fontsizes = np.array([text.get_fontsize() for text in self.texts])
+		widths, heights = estimate_label_extents([text.get_text()
+												for text in self.texts], 1.)
+		widths, heights = widths * fontsizes * px_per_pt, heights * fontsizes * px_per_pt
+		fx = np.array([HA_COEFS.get(text.get_horizontalalignment(), 0.5)
+						for text in self.texts])
+		fy = np.array([VA_COEFS.get(text.get_verticalalignment(), 0.5)
+						for text in self.texts])
+		cos, sin = np.cos(angles), np.sin(angles)
+
+		## Bounding box of rotated label
+		anchor_mode = np.array([text.get_rotation_mode() == 'anchor'
+								for text in self.texts])
+		## Alignment before rotation: rotate corners around anchor point
+		dx = np.array([-fx * widths, (1 - fx) * widths])
+		dy = np.array([-fy * heights, (1 - fy) * heights])
+		corners_x = [cos * dx[i] - sin * dy[j] for i in (0, 1) for j in (0, 1)]
+		corners_y = [sin * dx[i] + cos * dy[j] for i in (0, 1) for j in (0, 1)]
+		x0, x1 = np.min(corners_x, axis=0), np.max(corners_x, axis=0)
+		y0, y1 = np.min(corners_y, axis=0), np.max(corners_y, axis=0)
+		## Alignment after rotation: align rotated bounding box
+		bbox_width = np.abs(cos) * widths + np.abs(sin) * heights
+		bbox_height = np.abs(sin) * widths + np.abs(cos) * heights
+		x0 = np.where(anchor_mode, x0, -fx * bbox_width)
+		x1 = np.where(anchor_mode, x1, (1 - fx) * bbox_width)
+		y0 = np.where(anchor_mode, y0, -fy * bbox_height)
+		y1 = np.where(anchor_mode, y1, (1 - fy) * bbox_height)
+
+		## Skip labels anchored outside axes (also removes NaNs)
+		px, py = xy[:,0], xy[:,1]
+		valid = np.isfinite(px) & np.isfinite(py)
+		if self.axes is not None:
+			bbox = self.axes.bbox
+			valid &= ((px >= bbox.x0) & (px <= bbox.x1)
+					& (py >= bbox.y0) & (py <= bbox.y1))
+		valid = np.flatnonzero(valid)
+		idxs = valid[select_non_overlapping(px[valid] + x0[valid],
+											py[valid] + y0[valid],
+											px[valid] + x1[valid],
+											py[valid] + y1[valid])]
+		visible = np.zeros(len(self.texts), dtype=bool)
+		visible[idxs] = True
+		for text, is_visible in zip(self.texts, visible):
+			text.set_visible(is_visible)
+
+		return idxs
+
+	def draw(self, renderer):
+		self.cull(renderer)
+		self.stale = False
@@ -0,0 +1,234 @@
+"""
+Analytic placement of colorbar Axes next to or inside a parent Axes
+
+Positions are computed from the figure size and the (original) position
+and aspect of the parent Axes, in the same way as matplotlib would do
+when drawing, but without creating Axes or forcing an aspect pass.
+Results are cached, so that repeated plots with the same figure
+geometry do not need to lay out the colorbar again.
+
+Only depends on the standard library, so these functions can be used
+without importing matplotlib
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+__all__ = ['get_colorbar_layout']
+
+
+## Anchor coefficients of colorbar (cax) and parent Axes for each
+## location, as in matplotlib's make_axes
+CAX_ANCHORS = {'left': (1.0, 0.5), 'right': (0.0, 0.5),
+				'top': (0.5, 0.0), 'bottom': (0.5, 1.0)}
+PARENT_ANCHORS = {'left': (0.0, 0.5), 'right': (1.0, 0.5),
+				'top': (0.5, 1.0), 'bottom': (0.5, 0.0)}
+
+## Relative position corresponding to alignment keywords
+ALIGN_COEFS = {'left': 0.0, 'bottom': 0.0, 'center': 0.5,
+				'right': 1.0, 'top': 1.0}
+
+## Maximum number of cached layouts
+MAX_CACHE_SIZE = 256
+
+_LAYOUT_CACHE = {}
+
+
+def _shrink_to_aspect(box, box_aspect, fig_aspect, anchor):
+	"""
+	Shrink box to given aspect ratio and anchor it inside the original
+	box, as matplotlib does for Axes with fixed aspect
+
+	:param box:
+		(left, bottom, width, height) tuple, in figure coordinates
+	:param box_aspect:
+		float, height / width ratio of box (in physical units)
+	:param fig_aspect:
+		float, height / width ratio of figure
+	:param anchor:
+		(x, y) tuple, anchor coefficients
+
+	:return:
+		(left, bottom, width, height) tuple
+	"""
+	left, bottom, width, height = box
+	new_height = width * box_aspect / fig_aspect
+	if new_height <= height:
+		new_width = width
+	else:
+		new_width = height * fig_aspect / box_aspect
+		new_height = height
+	left += anchor[0] * (width - new_width)
+	bottom += anchor[1] * (height - new_height)
+	return (left, bottom, new_width, new_height)
+
+
+def _compute_colorbar_layout(fig_size, ax_position, location, align, inside,
+							size, padding, shrink, length, aspect, ax_box_aspect,
+							ax_anchor):
+	"""
+	Compute colorbar layout, see :func:`get_colorbar_layout`
+	"""
+	fig_width, fig_height = fig_size
+	fig_aspect = fig_height / fig_width
+	left, bottom, width, height = ax_position
+	orientation = 'horizontal' if location in ('top', 'bottom') else 'vertical'
+
+	if inside:
+		## Parent Axes is not modified, colorbar is anchored inside
+		## its active position, at padding (inches) from its edges
+		ax_box = ax_position
+		if ax_box_aspect:
+			ax_box = _shrink_to_aspect(ax_box, ax_box_aspect, fig_aspect,
+										ax_anchor)
+		left, bottom, width, height = ax_box
+		if orientation == 'horizontal':
+			cax_width = width * length
+			cax_height = height * length / aspect
+			anchor = (ALIGN_COEFS[align], ALIGN_COEFS[location])
+		else:
+			cax_height = height * length
+			cax_width = width * length / aspect
+			anchor = (ALIGN_COEFS[location], ALIGN_COEFS[align])
+		pad_x, pad_y = padding / fig_width, padding / fig_height
+		cax_left = (left + pad_x
+					+ anchor[0] * (width - 2 * pad_x - cax_width))
+		cax_bottom = (bottom + pad_y
+					+ anchor[1] * (height - 2 * pad_y - cax_height))
+		return (None, (cax_left, cax_bottom, cax_width, cax_height))
+
+	## Steal space from parent Axes, as matplotlib's make_axes does
+	aspect *= length
+	cax_anchor = CAX_ANCHORS[location]
+	if orientation == 'vertical':
+		cax_width = width * size
+		ax_width = width * (1 - size - padding)
+		if location == 'left':
+			cax_left = left
+			new_ax_position = (left + width - ax_width, bottom, ax_width, height)
+		else:
+			cax_left = left + width - cax_width
+			new_ax_position = (left, bottom, ax_width, height)
+		cax_box = (cax_left, bottom + cax_anchor[1] * height * (1 - shrink),
+					cax_width, height * shrink)
+		cax_box_aspect = aspect
+	else:
+		cax_height = height * size
+		ax_height = height * (1 - size - padding)
+		if location == 'bottom':
+			cax_bottom = bottom
+			new_ax_position = (left, bottom + height - ax_height, width, ax_height)
+		else:
+			cax_bottom = bottom + height - cax_height
+			new_ax_position = (left, bottom, width, ax_height)
+		cax_box = (left + cax_anchor[0] * width * (1 - shrink), cax_bottom,
+					width * shrink, cax_height)
+		cax_box_aspect = 1. / aspect
+
+	## Thickness of colorbar follows from its aspect ratio in the
+	## shrunk box (so that shrink reduces both length and thickness)
+	cax_left, cax_bottom, cax_width, cax_height = _shrink_to_aspect(cax_box,
+								cax_box_aspect, fig_aspect, cax_anchor)
+
+	## Active position of parent Axes, anchored toward the colorbar
+	ax_box = new_ax_position
+	if ax_box_aspect:
+		ax_box = _shrink_to_aspect(ax_box, ax_box_aspect, fig_aspect,
+									PARENT_ANCHORS[location])
+	ax_left, ax_bottom, ax_width, ax_height = ax_box
+
+	## Colorbar length and alignment along active position of parent Axes
+	anchor_coef = ALIGN_COEFS[align]
+	if orientation == 'vertical':
+		unshrinked_height = ax_height / shrink
+		cax_height = ax_height * length
+		cax_bottom = (ax_bottom + ax_height / 2. - unshrinked_height / 2.
+					+ anchor_coef * (unshrinked_height - cax_height))
+	else:
+		unshrinked_width = ax_width / shrink
+		cax_width = ax_width * length
+		cax_left = (ax_left + ax_width / 2. - unshrinked_width / 2.
+					+ anchor_coef * (unshrinked_width - cax_width))
+
+	## Colorbar is shortened again if it is too long for its thickness
+	cax_position = _shrink_to_aspect((cax_left, cax_bottom, cax_width, cax_height),
+								cax_box_aspect, fig_aspect, cax_anchor)
+
+	return (new_ax_position, cax_position)
+
+
+def get_colorbar_layout(fig_size, ax_position, cbar_location='bottom center',
+						inside=False, cax_size=0.1, cax_padding=0.1,
+						cax_shrink=1., cbar_length=1., cbar_aspect=20,
+						ax_box_aspect=None, ax_anchor=(0.5, 0.5)):
+	"""
+	Compute position of colorbar Axes (and new position of parent Axes)
+
+	:param fig_size:
+		(width, height) tuple, figure size in inches
+	:param ax_position:
+		(left, bottom, width, height) tuple, original position of parent
+		Axes in figure coordinates
+	:param cbar_location:
+		str, location (side of parent axes) and alignment of colorbar,
+		see :func:`generic_mpl.plot_grid`
+		(default: 'bottom center')
+	:param inside:
+		bool, whether colorbar should be placed inside parent Axes
+		(default: False)
+	:param cax_size:
+		float, fraction of parent Axes to use for colorbar Axes.
+		Ignored if :param:`inside` is True
+		(default: 0.1)
+	:param cax_padding:
+		float, fraction of parent Axes between colorbar and parent Axes,
+		or, if :param:`inside` is True, padding in inches between
+		colorbar and edges of parent Axes
+		(default: 0.1)
+	:param cax_shrink:
+		float, fraction by which to shrink cax
+		Ignored if :param:`inside` is True
+		(default: 1.)
+	:param cbar_length:
+		float, length of colorbar as fraction of Axes width or height
+		(default: 1.)
+	:param cbar_aspect:
+		float, aspect ratio (long/short dimension) of colorbar
+		(default: 20)
+	:param ax_box_aspect:
+		float, height / width ratio of parent Axes if it has a fixed
+		aspect (determined by :meth:`Axes.get_data_ratio` for data
+		aspect)
+		(default: None, parent Axes fills its position)
+	:param ax_anchor:
+		(x, y) tuple, anchor coefficients of parent Axes with fixed
+		aspect. Only used if :param:`inside` is True, otherwise the
+		parent Axes is anchored toward the colorbar
+		(default: (0.5, 0.5))
+
+	:return:
+		(ax_position, cax_position) tuple of (left, bottom, width, height)
+		tuples in figure coordinates, :param:`ax_position` is None if
+		:param:`inside` is True (parent Axes is not modified)
+	"""
+	location, _, align = cbar_location.partition(' ')
+	align = align or 'center'
+	if not location in CAX_ANCHORS:
+		raise ValueError('Unknown colorbar location: %s' % location)
+	if not align in ALIGN_COEFS:
+		raise ValueError('Unknown colorbar alignment: %s' % align)
+
+	args = (tuple(float(val) for val in fig_size),
+			tuple(float(val) for val in ax_position), location, align,
+			bool(inside), float(cax_size), float(cax_padding), float(cax_shrink),
+			float(cbar_length), float(cbar_aspect),
+			None if ax_box_aspect is None else float(ax_box_aspect),
+			tuple(float(val) for val in ax_anchor))
+	layout = _LAYOUT_CACHE.get(args)
+	if layout is None:
+		layout = _compute_colorbar_layout(*args)
+		if len(_LAYOUT_CACHE) >= MAX_CACHE_SIZE:
+			_LAYOUT_CACHE.clear()
+		_LAYOUT_CACHE[args] = layout
+
+	return layout
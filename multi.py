@@ -15,7 +15,6 @@ except:
 import matplotlib
 import matplotlib.gridspec as gridspec
 from matplotlib.offsetbox import AnchoredText
-import pylab
 
 
 
@@ -160,6 +159,8 @@ def create_multi_plot(num_rows, num_cols, wspace=None, hspace=None,
 		Note that figure contains one additional hidden axes holding
 		overall X and Y labels
 	"""
+	import pylab
+
 	## Note: Not possible to add style_sheet argument, as it will be overridden
 	## for each individual panel
 
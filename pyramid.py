@@ -0,0 +1,181 @@
+"""
+Block reduction of large grids to (roughly) output resolution,
+with caching of reduced grids (pyramid levels)
+
+Only depends on numpy, so these functions can be used without
+importing matplotlib
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+import weakref
+
+import numpy as np
+
+
+__all__ = ['block_reduce', 'get_pyramid_level', 'select_pyramid_level']
+
+
+## Maximum number of data elements to convert at once
+DEFAULT_CHUNK_SIZE = 2**22
+
+REDUCERS = ['mean', 'max', 'nearest']
+
+
+def _get_float_dtype(data):
+	"""
+	Floating-point dtype able to hold NaN values, preserving the dtype
+	of floating-point data
+
+	:param data:
+		array
+
+	:return:
+		numpy dtype
+	"""
+	if np.issubdtype(data.dtype, np.floating):
+		return data.dtype
+	else:
+		return np.dtype(np.float64)
+
+
+def block_reduce(data, factor, reducer='mean', chunk_size=DEFAULT_CHUNK_SIZE):
+	"""
+	Reduce 2D grid by combining blocks of cells, ignoring NaN values
+	(and masked values for masked arrays). If the grid dimensions are
+	not a multiple of the block size, the last row and column of blocks
+	are partial. The data are processed in bands of rows, so that
+	memory-mapped grids are never loaded entirely.
+
+	:param data:
+		2D array (num_rows x num_cols), gridded data
+	:param factor:
+		int or (row_factor, col_factor) tuple, block size
+	:param reducer:
+		str, how to combine cells in each block:
+		- 'mean': mean of non-NaN values
+		- 'max': maximum of non-NaN values
+		- 'nearest': value of cell nearest to the center of the block
+		(default: 'mean')
+	:param chunk_size:
+		int, approximate maximum number of cells to process at once
+		(default: 2**22)
+
+	:return:
+		2D float array (ceil(num_rows / row_factor) x
+		ceil(num_cols / col_factor)), NaN for blocks without values
+	"""
+	if np.isscalar(factor):
+		factor = (factor, factor)
+	fy, fx = [int(f) for f in factor]
+	ny, nx = data.shape
+	nby, nbx = -(-ny // fy), -(-nx // fx)
+	dtype = _get_float_dtype(data)
+
+	if reducer == 'nearest':
+		## Only the selected cells are read
+		rows = np.minimum(np.arange(nby) * fy + fy // 2, ny - 1)
+		cols = np.minimum(np.arange(nbx) * fx + fx // 2, nx - 1)
+		reduced = data[rows][:,cols]
+		if isinstance(reduced, np.ma.MaskedArray):
+			reduced = reduced.astype(dtype).filled(np.nan)
+		return np.asarray(reduced, dtype=dtype)
+
+	elif not reducer in REDUCERS:
+		raise ValueError('Unknown reducer: %s' % reducer)
+
+	reduced = np.empty((nby, nbx), dtype=dtype)
+	rows_per_chunk = max(1, chunk_size // (fy * fx * nbx))
+	for i0 in range(0, nby, rows_per_chunk):
+		i1 = min(i0 + rows_per_chunk, nby)
+		band = data[i0*fy:i1*fy]
+		if isinstance(band, np.ma.MaskedArray):
+			band = band.astype(dtype).filled(np.nan)
+		## Pad band with NaN to complete blocks
+		blocks = np.full(((i1 - i0) * fy, nbx * fx), np.nan, dtype=dtype)
+		blocks[:band.shape[0], :nx] = band
+		blocks = blocks.reshape(i1 - i0, fy, nbx, fx)
+
+		if reducer == 'mean':
+			valid = ~np.isnan(blocks)
+			num_valid = valid.sum(axis=(1, 3))
+			blocks[~valid] = 0
+			with np.errstate(invalid='ignore', divide='ignore'):
+				np.divide(blocks.sum(axis=(1, 3)), num_valid, out=reduced[i0:i1])
+		elif reducer == 'max':
+			reduced[i0:i1] = np.fmax.reduce(blocks, axis=(1, 3))
+
+	return reduced
+
+
+def select_pyramid_level(num_cells, num_pixels):
+	"""
+	Determine largest power-of-2 block size for each axis that does not
+	reduce the number of cells below the number of pixels
+
+	:param num_cells:
+		(num_rows, num_cols) tuple, number of (visible) grid cells
+	:param num_pixels:
+		(height, width) tuple, number of output pixels
+
+	:return:
+		(row_factor, col_factor) tuple of ints
+	"""
+	factors = []
+	for nc, npx in zip(num_cells, num_pixels):
+		if npx > 0 and nc >= 2 * npx:
+			factors.append(2 ** int(np.floor(np.log2(nc / npx))))
+		else:
+			factors.append(1)
+	return tuple(factors)
+
+
+## Reduced grids and version token, keyed by id of data array
+_PYRAMID_CACHE = {}
+
+
+def get_pyramid_level(data, factor, reducer='mean', version=None):
+	"""
+	Get reduced grid (see :func:`block_reduce`), which is cached as long
+	as :param:`data` exists, so that subsequent plots of (parts of)
+	the same grid at the same resolution do not need to reduce it again.
+
+	The cache cannot detect if :param:`data` is modified in place.
+	In that case, a different :param:`version` must be passed, which
+	discards all cached levels of the previous version.
+
+	:param data:
+		2D array, gridded data
+	:param factor:
+		(row_factor, col_factor) tuple, block size
+	:param reducer:
+		str, reducer, see :func:`block_reduce`
+		(default: 'mean')
+	:param version:
+		hashable, version token of the data
+		(default: None)
+
+	:return:
+		2D float array, reduced grid
+	"""
+	key = id(data)
+	entry = _PYRAMID_CACHE.get(key)
+	if entry is None or entry[0]() is not data or entry[2] != version:
+		def remove_entry(ref, key=key):
+			if _PYRAMID_CACHE.get(key, (None,))[0] is ref:
+				del _PYRAMID_CACHE[key]
+		try:
+			ref = weakref.ref(data, remove_entry)
+		except TypeError:
+			## Object cannot be cached
+			return block_reduce(data, factor, reducer)
+		entry = (ref, {}, version)
+		_PYRAMID_CACHE[key] = entry
+
+	levels = entry[1]
+	level_key = (tuple(factor), reducer)
+	if not level_key in levels:
+		levels[level_key] = block_reduce(data, factor, reducer)
+
+	return levels[level_key]
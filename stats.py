@@ -0,0 +1,172 @@
+"""
+Summary statistics of (large) gridded data, independent of matplotlib
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+import numpy as np
+
+
+__all__ = ['GridStats']
+
+
+## Maximum number of data elements to process at once
+DEFAULT_CHUNK_SIZE = 2**22
+
+
+class GridStats(object):
+	"""
+	Summary statistics of gridded data (minimum, maximum, number of
+	valid values and quantiles), ignoring NaN and masked values.
+	All statistics are computed in a single pass over bands of rows,
+	so that memory-mapped grids are never loaded entirely.
+
+	Quantiles are computed from a regular subsample of the valid
+	values, and are exact if the grid does not contain more than
+	:param:`sample_size` cells.
+
+	Instances can be computed once and passed to :func:`plot_grid`
+	for several frames or panels, and can be combined with
+	:meth:`merge`.
+
+	:param data:
+		2D array, gridded data (may be memory-mapped or masked)
+		(default: None, will create empty statistics)
+	:param sample_size:
+		int, maximum number of values to retain for quantiles,
+		or None or 0 to disable quantiles
+		(default: 2**16)
+	:param chunk_size:
+		int, approximate maximum number of cells to process at once
+		(default: 2**22)
+	"""
+	def __init__(self, data=None, sample_size=2**16,
+				chunk_size=DEFAULT_CHUNK_SIZE):
+		self.min = np.nan
+		self.max = np.nan
+		self.count = 0
+		self.sample_size = sample_size or 0
+		self.samples = np.array([])
+		self.sample_step = 1
+
+		if data is not None:
+			self.add(data, chunk_size=chunk_size)
+
+	def __repr__(self):
+		return '<GridStats: min=%s, max=%s, count=%d>' % (self.min, self.max,
+														self.count)
+
+	@property
+	def data_range(self):
+		"""
+		(min, max) tuple of floats
+		"""
+		return (self.min, self.max)
+
+	def add(self, data, chunk_size=DEFAULT_CHUNK_SIZE):
+		"""
+		Add data to statistics
+
+		:param data:
+			2D array, gridded data (may be memory-mapped or masked)
+		:param chunk_size:
+			int, approximate maximum number of cells to process at once
+			(default: 2**22)
+		"""
+		data = np.asanyarray(data)
+		if data.ndim < 2:
+			data = data.reshape(1, -1)
+		if self.sample_size:
+			## Regular sampling step, so that not more than sample_size
+			## values are retained for the whole grid
+			step = max(1, -(-data.size // self.sample_size))
+		else:
+			step = 0
+		row_size = max(1, data[0].size)
+		rows_per_chunk = max(1, chunk_size // row_size)
+
+		data_min, data_max, count = np.nan, np.nan, 0
+		samples = []
+		for i in range(0, len(data), rows_per_chunk):
+			band = data[i:i+rows_per_chunk]
+			if isinstance(band, np.ma.MaskedArray):
+				## Masked values are treated as NaN
+				band = band.astype(np.float64).filled(np.nan)
+			band = band.ravel()
+			if np.issubdtype(band.dtype, np.floating):
+				num_valid = band.size - np.count_nonzero(np.isnan(band))
+			else:
+				num_valid = band.size
+			if num_valid:
+				data_min = np.fmin(data_min, np.fmin.reduce(band))
+				data_max = np.fmax(data_max, np.fmax.reduce(band))
+				count += num_valid
+				if step:
+					## Continue sampling step across bands
+					start = (-i * row_size) % step
+					sample = band[start::step]
+					samples.append(sample[~np.isnan(sample)]
+									if sample.dtype.kind == 'f' else sample)
+
+		self.min = float(np.fmin(self.min, data_min))
+		self.max = float(np.fmax(self.max, data_max))
+		self.count += int(count)
+		if step:
+			self._add_samples(np.concatenate(samples) if samples else [], step)
+
+	def _add_samples(self, samples, step):
+		"""
+		Add (sorted) samples, keeping them at a common (coarsest)
+		sampling step and within :attr:`sample_size`
+
+		:param samples:
+			1-D array, sampled values
+		:param step:
+			int, sampling step of :param:`samples`
+		"""
+		samples = np.sort(np.asarray(samples, dtype=np.float64))
+		if len(self.samples) and step != self.sample_step:
+			## Thin the most densely sampled set
+			if step > self.sample_step:
+				factor = step // self.sample_step
+				self.samples = self.samples[::max(1, factor)]
+			else:
+				samples = samples[::max(1, self.sample_step // step)]
+			step = max(step, self.sample_step)
+		all_samples = np.concatenate([self.samples, samples])
+		while len(all_samples) > self.sample_size:
+			all_samples = np.sort(all_samples)[::2]
+			step *= 2
+		self.samples = np.sort(all_samples)
+		self.sample_step = step
+
+	def merge(self, other):
+		"""
+		Merge with statistics of other data (e.g., other frames or
+		panels sharing the same color scale)
+
+		:param other:
+			instance of :class:`GridStats`
+		"""
+		self.min = float(np.fmin(self.min, other.min))
+		self.max = float(np.fmax(self.max, other.max))
+		self.count += other.count
+		if self.sample_size and other.sample_size:
+			self._add_samples(other.samples, other.sample_step)
+
+	def get_quantile(self, q):
+		"""
+		Get quantile(s) of the data
+
+		:param q:
+			float or array of floats in the range 0 - 1
+
+		:return:
+			float or array, NaN if there are no valid values
+		"""
+		if not self.sample_size:
+			raise ValueError('Quantiles require a sample size')
+		if not len(self.samples):
+			return np.full(np.shape(q), np.nan)[()]
+		return np.quantile(self.samples, q)
@@ -0,0 +1,44 @@
+"""
+Tests for cache keys of rendered plots
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+
+from generic_mpl.cache import RenderCache
+
+
+def _get_datasets(start='2020-01-01', unit='D'):
+	dates = np.arange(np.datetime64(start, unit), np.datetime64('2020-01-10', unit))
+	return [(dates, np.arange(len(dates)))]
+
+
+def test_datetime64_key(tmp_path):
+	cache = RenderCache(str(tmp_path))
+	key = cache.get_key('plot_xy', {'datasets': _get_datasets()}, 'a.png',
+						ignore_unhashable=True)
+	assert key is not None
+	assert cache.bypasses == 0
+	assert key == cache.get_key('plot_xy', {'datasets': _get_datasets()}, 'b.png')
+	## Different dates or units give different keys
+	assert key != cache.get_key('plot_xy', {'datasets': _get_datasets('2020-01-02')},
+								'a.png')
+	assert key != cache.get_key('plot_xy', {'datasets': _get_datasets(unit='h')},
+								'a.png')
+
+
+def test_timedelta64_key(tmp_path):
+	cache = RenderCache(str(tmp_path))
+	deltas = np.arange(5).astype('timedelta64[s]')
+	key = cache.get_key('plot_xy', {'datasets': [(deltas, np.arange(5))]}, 'a.png')
+	assert key != cache.get_key('plot_xy', {'datasets': [(deltas.astype('timedelta64[ms]'),
+								np.arange(5))]}, 'a.png')
+
+
+def test_unhashable_key_is_bypassed(tmp_path):
+	cache = RenderCache(str(tmp_path))
+	key = cache.get_key('plot_xy', {'title': lambda: None}, 'a.png',
+						ignore_unhashable=True)
+	assert key is None
+	assert cache.bypasses == 1
@@ -0,0 +1,70 @@
+"""
+Tests for parallel accumulation of point densities
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from generic_mpl.density import (DensityAccumulator, HexbinAccumulator,
+								accumulate_parallel)
+
+
+EXTENT = (0., 1., 0., 1.)
+
+
+def _get_xy(num_points=100000, seed=42):
+	rng = np.random.RandomState(seed)
+	return (rng.rand(num_points), rng.rand(num_points), rng.rand(num_points))
+
+
+def test_parallel_counts_match_serial():
+	x, y, _ = _get_xy()
+	serial = accumulate_parallel(DensityAccumulator((20, 10), EXTENT), x, y)
+	parallel = accumulate_parallel(DensityAccumulator((20, 10), EXTENT), x, y,
+									workers=3, chunk_size=10000)
+	assert serial.counts.sum() == len(x)
+	np.testing.assert_array_equal(parallel.counts, serial.counts)
+
+
+def test_parallel_statistic_matches_serial():
+	x, y, values = _get_xy()
+	serial = accumulate_parallel(HexbinAccumulator((15, 15), EXTENT,
+									statistic='mean'), x, y, values=values)
+	parallel = accumulate_parallel(HexbinAccumulator((15, 15), EXTENT,
+									statistic='mean'), x, y, values=values,
+									workers=2)
+	np.testing.assert_array_equal(parallel.counts, serial.counts)
+	np.testing.assert_allclose(parallel.get_values(), serial.get_values())
+
+
+def test_parallel_npy_files(tmp_path):
+	x, y, _ = _get_xy()
+	x_file, y_file = str(tmp_path / 'x.npy'), str(tmp_path / 'y.npy')
+	np.save(x_file, x)
+	np.save(y_file, y)
+	serial = accumulate_parallel(DensityAccumulator((10, 10), EXTENT), x, y)
+	parallel = accumulate_parallel(DensityAccumulator((10, 10), EXTENT),
+									x_file, y_file, workers=2)
+	np.testing.assert_array_equal(parallel.counts, serial.counts)
+
+
+def test_parallel_no_resource_tracker_warnings():
+	## Shared memory must not be unlinked or reported as leaked
+	## by the resource tracker
+	script = '\n'.join([
+		'import numpy as np',
+		'from generic_mpl.density import DensityAccumulator, accumulate_parallel',
+		'x = np.linspace(0, 1, 10000)',
+		'acc = accumulate_parallel(DensityAccumulator((5, 5), (0, 1, 0, 1)),',
+		'						x, x[::-1].copy(), workers=2)',
+		'assert acc.counts.sum() == len(x)'])
+	result = subprocess.run([sys.executable, '-c', script], env=os.environ,
+							stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	assert result.returncode == 0, result.stderr
+	assert b'resource_tracker' not in result.stderr, result.stderr
+	assert b'leaked' not in result.stderr, result.stderr
@@ -11,25 +11,140 @@ except:
 	## Python 3
 	basestring = str
 
-import datetime
+import copy
 
 import numpy as np
-import pylab
 import matplotlib
 from matplotlib.font_manager import FontProperties
-
-from .common import (show_or_save_plot, common_doc)
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
+
+from .common import (show_or_save_plot, common_doc, headless_aware,
+					create_fig_and_ax, get_ax_pixel_size)
+from .decimate import (lttb_indices, minmax_buckets, is_sorted)
+from .labels import add_point_labels
+from .density import (DensityGrid, compute_density, convert_dates)
 from .frame import (plot_ax_frame, ax_frame_doc)
 
 
 __all__ = ['plot_xy', 'plot_density']
 
 
+def _plot_counts(ax, counts, xedges, yedges, min_cnt=None, max_cnt=None,
+				values=None, use_imshow=False, **kwargs):
+	"""
+	Plot precomputed 2D histogram, equivalent to :meth:`ax.hist2d`
+
+	:param ax:
+		matplotlib Axes instance
+	:param counts:
+		2D array (num_x_cells x num_y_cells), counts
+	:param xedges:
+		1-D array, X coordinates of cell edges
+	:param yedges:
+		1-D array, Y coordinates of cell edges
+	:param min_cnt:
+		int, cells with lower counts are not displayed
+		(default: None)
+	:param max_cnt:
+		int, cells with higher counts are not displayed
+		(default: None)
+	:param values:
+		2D array (num_x_cells x num_y_cells), values to display instead
+		of the counts (:param:`min_cnt` and :param:`max_cnt` still
+		apply to the counts)
+		(default: None)
+	:param use_imshow:
+		bool, whether to draw the histogram as a single image rather
+		than as a mesh of quadrilaterals (requires regularly spaced
+		edges and linear axes)
+		(default: False)
+	:param kwargs:
+		additional keyword arguments understood by :meth:`ax.pcolormesh`
+		or :meth:`ax.imshow`
+
+	:return:
+		instance of :class:`matplotlib.collections.QuadMesh`
+		or :class:`matplotlib.image.AxesImage`
+	"""
+	if values is None:
+		values = counts.astype(np.float64)
+	else:
+		values = values.astype(np.float64)
+	if min_cnt is not None:
+		values[counts < min_cnt] = np.nan
+	if max_cnt is not None:
+		values[counts > max_cnt] = np.nan
+
+	if use_imshow:
+		## Hidden cells are NaN, drawn in the (transparent) bad color
+		extent = (xedges[0], xedges[-1], yedges[0], yedges[-1])
+		sm = ax.imshow(values.T, origin='lower', extent=extent, aspect='auto',
+						interpolation='nearest', **kwargs)
+	else:
+		sm = ax.pcolormesh(xedges, yedges, values.T, **kwargs)
+	ax.set_xlim(xedges[0], xedges[-1])
+	ax.set_ylim(yedges[0], yedges[-1])
+
+	return sm
+
+
+def _add_line_collection(ax, collected_lines):
+	"""
+	Draw collected line datasets as a single LineCollection,
+	and empty the collection
+
+	:param ax:
+		matplotlib Axes instance
+	:param collected_lines:
+		dict, mapping 'segments', 'colors', 'linewidths' and 'linestyles'
+		to lists with one element for each line dataset
+	"""
+	from matplotlib.collections import LineCollection
+
+	lc = LineCollection(collected_lines['segments'],
+						colors=collected_lines['colors'],
+						linewidths=collected_lines['linewidths'],
+						linestyles=collected_lines['linestyles'])
+	ax.add_collection(lc, autolim=True)
+	ax.autoscale_view()
+
+	for key in collected_lines.keys():
+		collected_lines[key] = []
+
+
+def _add_poly_collection(ax, collected_fills):
+	"""
+	Draw collected fill datasets as a single PolyCollection,
+	and empty the collection
+
+	:param ax:
+		matplotlib Axes instance
+	:param collected_fills:
+		dict, mapping 'verts', 'facecolors', 'edgecolors', 'linewidths'
+		and 'linestyles' to lists with one element for each fill dataset
+	"""
+	from matplotlib.collections import PolyCollection
+
+	pc = PolyCollection(collected_fills['verts'],
+						facecolors=collected_fills['facecolors'],
+						edgecolors=collected_fills['edgecolors'],
+						linewidths=collected_fills['linewidths'],
+						linestyles=collected_fills['linestyles'])
+	ax.add_collection(pc, autolim=True)
+	ax.autoscale_view()
+
+	for key in collected_fills.keys():
+		collected_fills[key] = []
+
+
+@headless_aware
 def plot_xy(datasets,
 			colors=[], fill_colors=[], linewidths=[1], linestyles=['-'], labels=[],
 			markers=[], marker_sizes=[6], marker_intervals=[],
 			marker_edge_colors=['k'], marker_fill_colors=[], marker_edge_widths=[1],
 			marker_labels=[], marker_label_fontsize='small',
+			marker_label_overlap=True, decimate=None, use_collections=False,
 			xscaling='lin', yscaling='lin',
 			xmin=None, xmax=None, ymin=None, ymax=None,
 			xlabel='', ylabel='', ax_label_fontsize='large',
@@ -43,12 +158,13 @@ def plot_xy(datasets,
 			hlines=[], hline_args={}, vlines=[], vline_args={},
 			legend_location=0, legend_fontsize='medium',
 			style_sheet='classic', border_width=0.2, skip_frame=False,
-			fig_filespec=None, figsize=None, dpi=300, ax=None):
+			fig_filespec=None, figsize=None, dpi=300, ax=None, headless=False):
 	"""
 	Generic function to plot (X, Y) data sets (lines, symbols and/or polygons)
 
 	:param datasets:
-		list with (x, y) array tuples (either values or datetimes)
+		list with (x, y) array tuples (either values or datetimes
+		or numpy datetime64 arrays)
 	:param colors:
 		list of line colors to cycle over for each dataset
 		or instance of :class:`matplotlib.colors.Colormap`
@@ -91,6 +207,39 @@ def plot_xy(datasets,
 	:param marker_edge_widths:
 		list of marker line widths to cycle over for each dataset
 		(default: [1])
+	:param marker_labels:
+		list of strings, labels for the data points of each dataset
+		(in the same order), or list of such lists to cycle over
+		for each dataset. Labels of points outside the axis limits
+		are skipped
+		(default: [])
+	:param marker_label_fontsize:
+		int or str, font size of marker labels
+		(default: 'small')
+	:param marker_label_overlap:
+		bool, whether or not marker labels may overlap. If False,
+		labels overlapping previously placed labels are dropped
+		(default: True)
+	:param decimate:
+		str, method to reduce the number of points in line datasets
+		(without markers or fill) to the number of pixel columns in
+		the output before plotting:
+		- None: no decimation
+		- 'lttb': Largest-Triangle-Three-Buckets, retains the points
+		that best preserve the visual shape of the line
+		- 'minmax': min/max envelope, draws a single path through
+		the minimum and maximum value in each pixel column, so that
+		extremes remain visible
+		- 'minmax_fill': same as 'minmax', but drawn as a band filled
+		with the line color
+		(default: None)
+	:param use_collections:
+		bool, whether or not to draw consecutive line datasets (without
+		markers or fill) as a single LineCollection, and consecutive
+		fill datasets as a single PolyCollection, instead of separate
+		lines and polygons, which is much faster for large numbers of
+		datasets
+		(default: False)
 	"""
 	frame_args = {key: val for (key, val) in locals().items()
 				if not key in ['datasets', 'colors', 'fill_colors', 'linewidths',
@@ -98,17 +247,20 @@ def plot_xy(datasets,
 							'marker_intervals', 'marker_edge_colors',
 							'marker_fill_colors', 'marker_edge_widths',
 							'marker_labels', 'marker_label_fontsize',
-							'legend_location', 'legend_fontsize', 'style_sheet',
+							'marker_label_overlap', 'decimate',
+							'use_collections', 'legend_location', 'legend_fontsize', 'style_sheet',
 							'border_width', 'skip_frame', 'fig_filespec',
-							'figsize', 'dpi', 'ax']}
+							'figsize', 'dpi', 'ax', 'headless']}
 
 	from itertools import cycle
 
-	pylab.style.use(style_sheet)
+	if not headless:
+		import pylab
+		pylab.style.use(style_sheet)
 
 	if ax is None:
 		#ax = pylab.axes()
-		fig, ax = pylab.subplots(figsize=figsize, facecolor='white')
+		fig, ax = create_fig_and_ax(figsize=figsize, headless=headless)
 	else:
 		fig = ax.get_figure()
 
@@ -116,7 +268,7 @@ def plot_xy(datasets,
 	if not colors:
 		#colors = ['b', 'g', 'r', 'c', 'm', 'y', 'k']
 		#colors = 'bgrcmyk'
-		colors = pylab.rcParams['axes.prop_cycle'].by_key()['color']
+		colors = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
 	if isinstance(colors, basestring):
 		colors = matplotlib.cm.get_cmap(colors)
 	if isinstance(colors, matplotlib.colors.Colormap):
@@ -157,6 +309,10 @@ def plot_xy(datasets,
 	marker_fill_colors = cycle(marker_fill_colors)
 	marker_edge_widths = cycle(marker_edge_widths)
 	labels = cycle(labels)
+	if len(marker_labels) and not isinstance(marker_labels[0], basestring):
+		marker_labels = cycle(marker_labels)
+	else:
+		marker_labels = cycle([marker_labels])
 
 	#if xscaling == 'lin':
 	#	if yscaling == 'lin':
@@ -171,6 +327,21 @@ def plot_xy(datasets,
 
 	x_is_date, y_is_date = False, False
 
+	if decimate:
+		num_pixel_cols = get_ax_pixel_size(ax, dpi if fig_filespec else None)[0]
+
+	## Line and fill datasets waiting to be drawn as a single collection
+	collected_lines = {'segments': [], 'colors': [], 'linewidths': [],
+						'linestyles': []}
+	collected_fills = {'verts': [], 'facecolors': [], 'edgecolors': [],
+						'linewidths': [], 'linestyles': []}
+	## Legend handles for datasets drawn in collections, and legend
+	## handles of all datasets in plotting order
+	legend_proxies = []
+	legend_handles = []
+	## Marker labels are placed after the frame has been drawn
+	marker_label_x, marker_label_y, marker_label_texts = [], [], []
+
 	for (x, y) in datasets:
 		assert len(x) == len(y)
 		color = next(colors)
@@ -184,21 +355,86 @@ def plot_xy(datasets,
 		marker_fill_color = next(marker_fill_colors)
 		marker_edge_width = next(marker_edge_widths)
 		label = next(labels)
+		dataset_marker_labels = next(marker_labels)
 
 		if len(x) == 0:
 			continue
 
-		if isinstance(x[0], datetime.datetime):
-			## Doesn't seem to be necessary
-			#x = pylab.date2num(x)
-			x_is_date = True
-		if isinstance(y[0], datetime.datetime):
-			#y = pylab.date2num(y)
-			y_is_date = True
-
-		if fill_color:
-			ax.fill(x, y, facecolor=fill_color, edgecolor=color, lw=linewidth,
-				ls=linestyle, label=label)
+		## Note: datetime objects are left to matplotlib
+		x, is_date = convert_dates(x)
+		x_is_date = x_is_date or is_date
+		y, is_date = convert_dates(y)
+		y_is_date = y_is_date or is_date
+
+		for i, lbl in enumerate(dataset_marker_labels):
+			marker_label_x.append(x[i])
+			marker_label_y.append(y[i])
+			marker_label_texts.append(lbl)
+
+		is_line = not (fill_color or marker or linestyle in ('', 'none', 'None')
+						or linewidth == 0)
+		if decimate and is_line and not y_is_date and len(x) > num_pixel_cols:
+			method = decimate
+			if method in ('minmax', 'minmax_fill') and not is_sorted(x):
+				print('Warning: X values not sorted or not finite, '
+						'dataset will not be decimated')
+				method = None
+			if method == 'lttb':
+				idxs = lttb_indices(x, y, num_pixel_cols)
+				x, y = np.asarray(x)[idxs], np.asarray(y)[idxs]
+			elif method in ('minmax', 'minmax_fill'):
+				idxs, ymin, ymax = minmax_buckets(x, y, num_pixel_cols)
+				x = np.asarray(x)[idxs]
+				if method == 'minmax_fill':
+					## Draw collected datasets first to preserve drawing order
+					if collected_lines['segments']:
+						_add_line_collection(ax, collected_lines)
+					if collected_fills['verts']:
+						_add_poly_collection(ax, collected_fills)
+					pc = ax.fill_between(x, ymin, ymax, facecolor=color,
+									edgecolor=color, lw=linewidth, ls=linestyle,
+									label=label)
+					legend_handles.append(pc)
+					continue
+				## Vertical segment per pixel column
+				x = np.repeat(x, 2)
+				y = np.column_stack([ymin, ymax]).ravel()
+			elif method:
+				raise ValueError('Unknown decimation method: %s' % decimate)
+
+		## Draw collected datasets first to preserve drawing order
+		if collected_lines['segments'] and not (use_collections and is_line):
+			_add_line_collection(ax, collected_lines)
+		if collected_fills['verts'] and not (use_collections and fill_color):
+			_add_poly_collection(ax, collected_fills)
+
+		if use_collections and (is_line or fill_color):
+			x = convert_dates(x, convert_objects=True)[0]
+			y = convert_dates(y, convert_objects=True)[0]
+
+		if use_collections and is_line:
+			collected_lines['segments'].append(np.column_stack([x, y]))
+			collected_lines['colors'].append(color)
+			collected_lines['linewidths'].append(linewidth)
+			collected_lines['linestyles'].append(linestyle)
+			if label != '_nolegend_':
+				legend_proxies.append(Line2D([], [], color=color, lw=linewidth,
+											ls=linestyle, label=label))
+				legend_handles.append(legend_proxies[-1])
+		elif fill_color:
+			if use_collections:
+				collected_fills['verts'].append(np.column_stack([x, y]))
+				collected_fills['facecolors'].append(fill_color)
+				collected_fills['edgecolors'].append(color)
+				collected_fills['linewidths'].append(linewidth)
+				collected_fills['linestyles'].append(linestyle)
+				if label != '_nolegend_':
+					legend_proxies.append(Patch(facecolor=fill_color, edgecolor=color,
+												lw=linewidth, ls=linestyle, label=label))
+					legend_handles.append(legend_proxies[-1])
+			else:
+				legend_handles += ax.fill(x, y, facecolor=fill_color, edgecolor=color,
+									lw=linewidth, ls=linestyle, label=label)
 			if marker:
 				ax.plot(x, y, marker, lw=0, ms=marker_size, mec=marker_edge_color,
 				mfc=marker_fill_color, mew=marker_edge_width, markevery=marker_interval,
@@ -208,42 +444,66 @@ def plot_xy(datasets,
 			#		and np.isscalar(marker_fill_color)):
 			if linestyle in ('', 'none', 'None') or linewidth == 0:
 				## No line, marker sizes and/or colors may be different
-				ax.scatter(x, y, s=np.power(marker_size, 2), edgecolors=marker_edge_color,
-					marker=marker, facecolors=marker_fill_color, linewidth=marker_edge_width,
-					label=label)
+				legend_handles.append(ax.scatter(x, y, s=np.power(marker_size, 2),
+					edgecolors=marker_edge_color, marker=marker,
+					facecolors=marker_fill_color, linewidth=marker_edge_width,
+					label=label))
 			else:
 				## Markers are associated with lines and should have same size/color
-				ax.plot(x, y, marker, color=color, ls=linestyle, lw=linewidth,
-					ms=marker_size, mec=marker_edge_color, mfc=marker_fill_color,
-					mew=marker_edge_width, markevery=marker_interval, label=label)
-
-		for i, lbl in enumerate(marker_labels):
-			ax.annotate(lbl, (x[i], y[i]), fontsize=marker_label_fontsize,
-							clip_on=True)
+				legend_handles += ax.plot(x, y, marker, color=color, ls=linestyle,
+					lw=linewidth, ms=marker_size, mec=marker_edge_color,
+					mfc=marker_fill_color, mew=marker_edge_width,
+					markevery=marker_interval, label=label)
+
+	if collected_lines['segments']:
+		_add_line_collection(ax, collected_lines)
+	if collected_fills['verts']:
+		_add_poly_collection(ax, collected_fills)
+	## Date units are not set automatically for converted dates
+	if x_is_date:
+		ax.xaxis_date()
+	if y_is_date:
+		ax.yaxis_date()
 
 	## Frame
 	if not skip_frame:
 		plot_ax_frame(ax, x_is_date=x_is_date, y_is_date=y_is_date, **frame_args)
 
+	## Marker labels
+	if marker_label_texts:
+		add_point_labels(ax, marker_label_x, marker_label_y, marker_label_texts,
+						fontsize=marker_label_fontsize,
+						allow_overlap=marker_label_overlap)
+
 	## Legend
 	legend_fontsize = legend_fontsize or tick_label_fontsize
 	legend_font = FontProperties(size=legend_fontsize)
 	## Avoid warning if there are no labeled curves
 	if len(unique_labels.difference(set(['_nolegend_', '']))):
-		ax.legend(loc=legend_location, prop=legend_font)
+		if legend_proxies:
+			## Keep legend entries in plotting order
+			handles = [handle for handle in legend_handles
+						if not handle.get_label().startswith('_')]
+			ax.legend(handles=handles, loc=legend_location, prop=legend_font)
+		else:
+			ax.legend(loc=legend_location, prop=legend_font)
 
 	#if fig and tight_layout:
 	#	fig.tight_layout(pad=0)
 
 	## Output
 	return show_or_save_plot(ax, fig_filespec=fig_filespec, dpi=dpi,
-							border_width=border_width)
+							border_width=border_width, headless=headless)
 
 plot_xy.__doc__ += (ax_frame_doc + common_doc)
 
 
-def plot_density(x, y, grid_size, density_type='hist2d', min_cnt=None, max_cnt=None,
+@headless_aware
+def plot_density(x, y=None, grid_size=None, density_type='hist2d',
+			min_cnt=None, max_cnt=None,
 			bins=None, cmap='plasma', cbar_args={}, cbar_label='N',
+			values=None, statistic='mean', chunk_size=None, workers=None,
+			bw_method='scott', use_imshow=False,
 			xscaling='lin', yscaling='lin',
 			xmin=None, xmax=None, ymin=None, ymax=None,
 			xlabel='', ylabel='', ax_label_fontsize='large',
@@ -256,25 +516,42 @@ def plot_density(x, y, grid_size, density_type='hist2d', min_cnt=None, max_cnt=N
 			hlines=[], hline_args={}, vlines=[], vline_args={},
 			title='', title_fontsize='large',
 			style_sheet='classic', border_width=0.2, skip_frame=False,
-			fig_filespec=None, figsize=None, dpi=300, ax=None):
+			fig_filespec=None, figsize=None, dpi=300, ax=None, headless=False):
 	"""
-	Plot XY data as density (number of data points per grid cell)
+	Plot XY data as density (number of data points per grid cell),
+	or as statistic of a third variable per grid cell
 
 	:param x:
-		1-D array, X data
+		1-D array, X data (values, datetimes or numpy datetime64),
+		may be memory-mapped
+		or str, full path to .npy file (will be memory-mapped)
+		or, if :param:`y` is None, iterable of (x_chunk, y_chunk) tuples
+		(requires :param:`xmin`, :param:`xmax`, :param:`ymin` and
+		:param:`ymax`)
+		or instance of :class:`DensityGrid` (see :func:`compute_density`),
+		in which case the density is not recomputed and :param:`y`,
+		:param:`grid_size`, :param:`density_type`, :param:`values`,
+		:param:`statistic`, :param:`chunk_size`, :param:`workers`
+		and :param:`bw_method` are ignored
 	:param y:
-		1-D array, Y data
+		1-D array or str, Y data corresponding to :param:`x`
+		(default: None)
 	:param grid_size:
 		int or (int, int) tuple, the number of grid cells in the X/Y
 		direction
+		or 'auto', one grid cell per output pixel (only for
+		:param:`density_type` 'hist2d' and 'kde')
 	:param density_type:
 		str, type of density plot: 'hist2d', 'hexbin' or 'kde'
 		(default: 'hist2d')
 	:param min_cnt:
-		int, minimum density to plot
+		int, minimum density to plot. If :param:`values` are given,
+		cells with fewer data points are not plotted
 		(default: None)
 	:param max_cnt:
-		int, maximum density to plot
+		int, maximum density to plot. If :param:`values` are given,
+		cells with more data points are not plotted (only for
+		:param:`density_type` 'hist2d')
 		(default: None)
 	:param bins:
 		None, 'log' or list or array with bin edges, density bins
@@ -287,43 +564,74 @@ def plot_density(x, y, grid_size, density_type='hist2d', min_cnt=None, max_cnt=N
 	:param cbar_label:
 		str, colorbar label
 		(default: 'N')
+	:param values:
+		1-D array or str, values to aggregate in each grid cell instead
+		of counting data points, see :func:`compute_density`.
+		Cells without values are not plotted
+		(default: None)
+	:param statistic:
+	:param chunk_size:
+	:param workers:
+	:param bw_method:
+		see :func:`compute_density`
+	:param use_imshow:
+		bool, whether to draw 'hist2d' and 'kde' densities as a single
+		image instead of a mesh, which is much faster to draw and results
+		in compact vector output. Ignored if one of the axes has
+		logarithmic scaling
+		(default: False)
 	"""
 	frame_args = {key: val for (key, val) in locals().items()
 				if not key in ['x', 'y', 'grid_size', 'density_type',
 							'min_cnt', 'max_cnt', 'cmap', 'bins', 'cbar_args',
-							'cbar_label', 'style_sheet', 'border_width',
-							'skip_frame', 'fig_filespec', 'figsize', 'dpi', 'ax']}
+							'cbar_label', 'values', 'statistic', 'chunk_size',
+							'workers', 'bw_method', 'use_imshow',
+							'style_sheet', 'border_width', 'skip_frame',
+							'fig_filespec', 'figsize', 'dpi', 'ax', 'headless']}
 
-	pylab.style.use(style_sheet)
+	if not headless:
+		import pylab
+		pylab.style.use(style_sheet)
 
 	if ax is None:
 		#ax = pylab.axes()
-		fig, ax = pylab.subplots(figsize=figsize, facecolor='white')
+		fig, ax = create_fig_and_ax(figsize=figsize, headless=headless)
 	else:
 		fig = ax.get_figure()
 
 	## Density plot
-	if isinstance(grid_size, int):
-		grid_size = (grid_size, grid_size)
+	if isinstance(x, DensityGrid):
+		density_grid = x
+	else:
+		if grid_size == 'auto':
+			if density_type == 'hexbin':
+				raise ValueError("grid_size 'auto' is not supported for hexbin")
+			grid_size = get_ax_pixel_size(ax, dpi if fig_filespec else None)
+		density_grid = compute_density(x, y, grid_size, density_type=density_type,
+										values=values, statistic=statistic,
+										xmin=xmin, xmax=xmax, ymin=ymin, ymax=ymax,
+										chunk_size=chunk_size, workers=workers,
+										bw_method=bw_method)
+	density_type = density_grid.density_type
+	has_values = density_grid.statistic is not None
+	x_is_date, y_is_date = density_grid.x_is_date, density_grid.y_is_date
+
+	## Images are only regular on linear axes
+	use_imshow = use_imshow and xscaling[:3] == yscaling[:3] == 'lin'
 
 	if cmap is None:
-		cmap = pylab.rcParams['image.cmap']
+		cmap = matplotlib.rcParams['image.cmap']
 	if not isinstance(cmap, matplotlib.colors.Colormap):
-		cmap = pylab.cm.get_cmap(cmap)
+		cmap = matplotlib.cm.get_cmap(cmap)
+	## Copy to avoid modifying registered colormap (not thread-safe)
+	cmap = copy.copy(cmap)
 	cmap.set_bad((1,1,1,0))
 	cmap.set_under((1,1,1,0))
 
-	nan_idxs = np.isnan(x) | np.isnan(y)
-	x, y = x[~nan_idxs], y[~nan_idxs]
-
-	_xmin = xmin if xmin is not None else x.min()
-	_xmax = xmax if xmax is not None else x.max()
-	_ymin = ymin if ymin is not None else y.min()
-	_ymax = ymax if ymax is not None else y.max()
-
 	if density_type == 'hist2d':
-		range = [[_xmin, _xmax], [_ymin, _ymax]]
-		if bins is None:
+		if bins is None and has_values:
+			norm = matplotlib.colors.Normalize()
+		elif bins is None:
 			#norm = None
 			norm = matplotlib.colors.Normalize(vmin=min_cnt, vmax=max_cnt)
 		elif bins == 'log':
@@ -331,22 +639,31 @@ def plot_density(x, y, grid_size, density_type='hist2d', min_cnt=None, max_cnt=N
 		else:
 			from mapping.layeredbasemap.cm.norm import PiecewiseLinearNorm
 			norm = PiecewiseLinearNorm(bins)
-		_, _, _, sm = ax.hist2d(x, y, bins=grid_size, range=range, cmap=cmap,
-								cmin=min_cnt, cmax=max_cnt, norm=norm)
+		sm = _plot_counts(ax, density_grid.counts, density_grid.xedges,
+						density_grid.yedges, min_cnt=min_cnt, max_cnt=max_cnt,
+						values=density_grid.values, use_imshow=use_imshow,
+						cmap=cmap, norm=norm)
 
 	elif density_type == 'hexbin':
-		extent = (_xmin, _xmax, _ymin, _ymax)
-		sm = ax.hexbin(x, y, gridsize=grid_size, cmap=cmap, bins=bins,
-						mincnt=min_cnt, extent=extent)
+		## Hexagon centers with their counts (or values) are binned
+		## by matplotlib
+		counts, offsets = density_grid.counts, density_grid.offsets
+		if has_values:
+			hex_values = density_grid.values
+			is_shown = ~np.isnan(hex_values)
+			if min_cnt is not None:
+				is_shown &= (counts >= min_cnt)
+		else:
+			hex_values = counts.astype(np.float64)
+			is_shown = (counts >= min_cnt) if min_cnt is not None else slice(None)
+		hex_values, offsets = hex_values[is_shown], offsets[is_shown]
+		sm = ax.hexbin(offsets[:,0], offsets[:,1], C=hex_values,
+						reduce_C_function=sum, gridsize=density_grid.grid_size,
+						cmap=cmap, bins=bins, extent=density_grid.extent)
 
 	elif density_type == 'kde':
-		from scipy.stats import kde
-		k = kde.gaussian_kde([x, y])
-		xi, yi = np.mgrid[_xmin: _xmax: grid_size[0]*1j, _ymin: _ymax: grid_size[1]*1j]
-		zi = k(np.vstack([xi.flatten(), yi.flatten()]))
-		## Un-normalize density
-		zi *= (float(len(x)) / np.sum(zi))
-		extent = (_xmin, _xmax, _ymin, _ymax)
+		zi = density_grid.values
+		xedges, yedges = density_grid.xedges, density_grid.yedges
 		if bins is None:
 			#norm = None
 			norm = matplotlib.colors.Normalize(vmin=min_cnt, vmax=max_cnt)
@@ -355,27 +672,29 @@ def plot_density(x, y, grid_size, density_type='hist2d', min_cnt=None, max_cnt=N
 		else:
 			from mapping.layeredbasemap.cm.norm import PiecewiseLinearNorm
 			norm = PiecewiseLinearNorm(bins)
-		sm = ax.pcolormesh(xi, yi, zi.reshape(xi.shape), cmap=cmap, norm=norm)
-		ax.axis(extent)
+		## Cells are centered on the KDE nodes
+		if use_imshow:
+			node_extent = (xedges[0], xedges[-1], yedges[0], yedges[-1])
+			sm = ax.imshow(zi.T, origin='lower', extent=node_extent, aspect='auto',
+							interpolation='nearest', cmap=cmap, norm=norm)
+		else:
+			sm = ax.pcolormesh(xedges, yedges, zi.T, cmap=cmap, norm=norm)
+		ax.axis(density_grid.extent)
 
 	## Frame
+	if x_is_date:
+		ax.xaxis_date()
+	if y_is_date:
+		ax.yaxis_date()
 	if not skip_frame:
-		if isinstance(x[0], datetime.datetime):
-			x_is_date = True
-		else:
-			x_is_date = False
-		if isinstance(y[0], datetime.datetime):
-			y_is_date = True
-		else:
-			y_is_date = False
 		plot_ax_frame(ax, x_is_date=x_is_date, y_is_date=y_is_date, **frame_args)
 
 	## Colorbar
-	cbar = pylab.colorbar(sm, ax=ax, **cbar_args)
+	cbar = fig.colorbar(sm, ax=ax, **cbar_args)
 	cbar.set_label(cbar_label)
 
 	## Output
 	return show_or_save_plot(ax, fig_filespec=fig_filespec, dpi=dpi,
-							border_width=border_width)
+							border_width=border_width, headless=headless)
 
 plot_density.__doc__ += (ax_frame_doc + common_doc)